@@ -0,0 +1,17 @@
+import pytest
+
+from core.runner import isolated_caches
+
+
+@pytest.fixture(autouse=True)
+def thumbnail_workers(settings):
+    # Тестовая база SQLite в памяти не выдерживает записи из потоков
+    # пула, поэтому миниатюры создаются сразу в запросе.
+    settings.THUMBNAIL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(settings, tmp_path):
+    # Кэши на SQLite и файлах пишутся во временный каталог, а не в
+    # общий CACHE_DIR запущенного рядом сервера.
+    settings.CACHES = isolated_caches(str(tmp_path))
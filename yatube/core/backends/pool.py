@@ -0,0 +1,143 @@
+"""Пул соединений с базой внутри процесса.
+
+Django 2.2 умеет только держать одно соединение на поток
+(CONN_MAX_AGE). С пулом соединение, которое Django закрывает в конце
+запроса, возвращается в очередь и достаётся следующему запросу
+любого потока. Так не нужно каждый раз заново подключаться и
+настраивать соединение.
+
+Настройки - ключ POOL у базы в DATABASES:
+MAX_SIZE - сколько свободных соединений держать, 0 отключает пул;
+MAX_LIFETIME - через сколько секунд соединение пересоздаётся;
+HEALTH_CHECKS - проверять ли соединение запросом перед выдачей.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 600,
+    'HEALTH_CHECKS': True,
+}
+
+
+class Pool:
+    def __init__(self, max_size, max_lifetime, health_checks):
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        # reused, created, recycled, broken, discarded
+        self.stats = Counter()
+
+    def acquire(self):
+        """Свободное рабочее соединение (born, connection) или None."""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                born, connection = self.idle.pop()
+            if time.monotonic() - born >= self.max_lifetime:
+                self.stats['recycled'] += 1
+                discard(connection)
+            elif self.health_checks and not healthy(connection):
+                self.stats['broken'] += 1
+                discard(connection)
+            else:
+                self.stats['reused'] += 1
+                return born, connection
+
+    def release(self, born, connection):
+        """Возвращает соединение в пул или закрывает лишнее."""
+        try:
+            # Незавершённая транзакция не должна достаться чужому запросу.
+            connection.rollback()
+        except Exception:
+            self.stats['broken'] += 1
+            discard(connection)
+            return
+        with self.lock:
+            if len(self.idle) < self.max_size:
+                self.idle.append((born, connection))
+                return
+        self.stats['discarded'] += 1
+        discard(connection)
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for _, connection in idle:
+            discard(connection)
+
+
+def healthy(connection):
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+def discard(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """Пул базы alias; после fork создаётся заново."""
+    with pools_lock:
+        pool = pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+            pool = pools[alias] = Pool(
+                options['MAX_SIZE'],
+                options['MAX_LIFETIME'],
+                options['HEALTH_CHECKS'],
+            )
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Берёт соединения из пула и возвращает их туда при закрытии."""
+
+    # Получено ли текущее соединение из пула уже настроенным
+    connection_reused = False
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        pooled = pool.acquire() if pool.max_size else None
+        if pooled is not None:
+            self.connection_born, connection = pooled
+            self.connection_reused = True
+            return connection
+        pool.stats['created'] += 1
+        self.connection_born = time.monotonic()
+        self.connection_reused = False
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        pool = self.pool
+        # Соединение, закрытое посреди atomic(), остаётся у обёртки.
+        if self.connection is None or self.in_atomic_block or not (
+            pool.max_size
+        ):
+            return super()._close()
+        pool.release(self.connection_born, self.connection)
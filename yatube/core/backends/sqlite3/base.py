@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite с пулом соединений; годится и как замена пулера в тестах."""
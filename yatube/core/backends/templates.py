@@ -0,0 +1,33 @@
+"""Шаблонный бэкенд Django, который замеряет время рендера."""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django
+
+from ..metrics import record_template_time
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record_template_time(time.perf_counter() - started)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """Стандартный бэкенд с замером рендера шаблонов.
+
+    include внутри шаблона отдельно не считается: его время входит
+    в рендер внешнего шаблона.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
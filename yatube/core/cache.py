@@ -0,0 +1,167 @@
+"""Кэш в файле SQLite, общий для всех процессов на одном сервере.
+
+В отличие от LocMemCache, каждый воркер gunicorn видит одни и те же
+записи, а incr() выполняется атомарно внутри транзакции с блокировкой
+на запись, поэтому на нём можно держать счётчики и версии лент.
+"""
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+)
+# Чистка считает строки под блокировкой на запись, поэтому выполняется
+# не при каждой записи, а при каждой CULL_EVERY-й
+CULL_EVERY = 100
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        options = params.get('OPTIONS', {})
+        self._cull_every = int(options.get('CULL_EVERY', CULL_EVERY))
+        self._writes = itertools.count(1)
+
+    def _connection(self):
+        # Соединение своё у каждого потока и процесса: после fork
+        # унаследованное соединение SQLite использовать нельзя.
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _expires(self, timeout):
+        # Абсолютное время истечения или None для вечных записей.
+        return self.get_backend_timeout(timeout)
+
+    def _fetch(self, connection, key):
+        row = connection.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _store(self, connection, key, value, timeout):
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self._expires(timeout))
+        )
+
+    def _cull(self, connection):
+        if next(self._writes) % self._cull_every:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (max(count // self._cull_frequency, 1),)
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self._fetch(self._connection(), key)
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._store(connection, key, value, timeout)
+            self._cull(connection)
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            added = self._fetch(connection, key) is None
+            if added:
+                self._store(connection, key, value, timeout)
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно увеличивает число: блокировка держится до COMMIT."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            value = self._fetch(connection, key)
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(value) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch(self._connection(), key) is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами одного потока.
+        pass
@@ -0,0 +1,102 @@
+"""Чтение с реплик и запись в основную базу.
+
+Реплики перечислены в DATABASE_REPLICAS. Чтение уходит на случайную
+реплику, кроме трёх случаев: реплик нет, идёт транзакция основной
+базы или код явно попросил основную базу через use_primary() или,
+до конца запроса, через pin_request(). Последнее нужно сразу после
+записи: реплика отстаёт и может ещё не знать о только что
+сохранённых данных.
+
+Здесь же настраивается каждое новое соединение SQLite: PRAGMA из
+SQLITE_PRAGMAS и ключа PRAGMAS у базы в DATABASES.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+state = threading.local()
+
+
+def sqlite_pragmas(settings_dict):
+    """PRAGMA для базы: общие из настроек, поверх них - свои у базы."""
+    return {
+        **getattr(settings, 'SQLITE_PRAGMAS', {}),
+        **settings_dict.get('PRAGMAS', {}),
+    }
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created для соединений SQLite."""
+    # Соединение из пула уже настроено.
+    if connection.vendor != 'sqlite' or getattr(
+        connection, 'connection_reused', False
+    ):
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.settings_dict).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def pinned():
+    """Читает ли текущий поток с основной базы."""
+    return (
+        getattr(state, 'pinned', 0) > 0
+        or getattr(state, 'request_pinned', False)
+    )
+
+
+def pin_request():
+    """Направляет в основную базу все чтения до конца запроса.
+
+    Снимает закрепление unpin_request() в ReadYourWritesMiddleware.
+    """
+    state.request_pinned = True
+
+
+def unpin_request():
+    state.request_pinned = False
+
+
+@contextmanager
+def use_primary():
+    """Направляет чтение текущего потока в основную базу."""
+    state.pinned = getattr(state, 'pinned', 0) + 1
+    try:
+        yield
+    finally:
+        state.pinned -= 1
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if (
+            not aliases
+            or pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе.
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема на реплики приходит репликацией из основной базы.
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,372 @@
+"""Нагрузочный прогон по записанному журналу запросов.
+
+Журнал - NDJSON, строка на запрос: {"path": "/group/cats/"} и,
+по желанию, "method", "user" (запрос от имени пользователя) и "data"
+(поля формы для POST). Подходит и текстовый журнал со строками вида
+"GET /posts/1/" или просто "/posts/1/". Пропорции адресов берутся из
+самого журнала.
+
+Запросы уходят либо в WSGI-приложение проекта в этом же процессе,
+либо на запущенный сервер по HTTP. Конкурентность - потоками или
+корутинами asyncio; WSGI-приложение синхронное, поэтому в режиме
+asyncio оно вызывается в пуле потоков того же размера.
+"""
+import asyncio
+import io
+import itertools
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client
+from django.urls import Resolver404, resolve
+from django.utils.crypto import get_random_string
+
+from .metrics import percentile
+
+MODES = ('threads', 'asyncio')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PERCENTILES = (50, 95, 99)
+
+
+def read_log(path):
+    """Записи журнала: словари с method, path, user и data."""
+    records = []
+    with open(path, encoding='utf-8') as log:
+        for number, line in enumerate(log, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise ValueError(f'Строка {number}: это не JSON.')
+                path = record.get('path') or record.get('url')
+                if not path:
+                    raise ValueError(f'Строка {number}: нет поля path.')
+            else:
+                method, _, path = line.rpartition(' ')
+                record = {'method': method or 'GET'}
+            records.append({
+                'method': record.get('method', 'GET').upper(),
+                # Из полного адреса нужен только путь с параметрами.
+                'path': urlsplit(path)._replace(
+                    scheme='', netloc=''
+                ).geturl() or '/',
+                'user': record.get('user'),
+                'data': record.get('data') or {},
+            })
+    return records
+
+
+def route(path):
+    """Имя view для сводки; адреса вне проекта группируются по пути."""
+    try:
+        return resolve(urlsplit(path).path).view_name
+    except Resolver404:
+        return urlsplit(path).path
+
+
+def login_cookies(usernames):
+    """Cookie сессий пользователей журнала, которые есть в базе.
+
+    Сессии создаются в базе проекта, поэтому для прогона по HTTP
+    сервер должен работать с той же базой.
+    """
+    cookies = {}
+    users = get_user_model().objects.filter(username__in=set(usernames))
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        cookies[user.username] = (
+            client.cookies[settings.SESSION_COOKIE_NAME].value
+        )
+    return cookies
+
+
+class ReplayRequest:
+    """Готовый к отправке запрос: метод, путь, заголовки и тело."""
+
+    def __init__(self, record, session=None):
+        self.method = record['method']
+        self.path = record['path']
+        self.body = urlencode(record['data'], doseq=True).encode()
+        cookies = {}
+        self.headers = {}
+        if session:
+            cookies[settings.SESSION_COOKIE_NAME] = session
+        if self.method not in SAFE_METHODS:
+            # Одинаковый токен в cookie и заголовке проходит проверку CSRF.
+            token = get_random_string(32)
+            cookies[settings.CSRF_COOKIE_NAME] = token
+            self.headers['X-CSRFToken'] = token
+            self.headers['Content-Type'] = (
+                'application/x-www-form-urlencoded'
+            )
+        if cookies:
+            self.headers['Cookie'] = '; '.join(
+                f'{name}={value}' for name, value in cookies.items()
+            )
+
+
+class WSGITarget:
+    """WSGI-приложение проекта в этом же процессе."""
+
+    name = 'wsgi'
+
+    def __init__(self, application=None):
+        self.application = application or WSGIHandler()
+
+    def send(self, request, timeout):
+        path, _, query = request.path.partition('?')
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_LENGTH': str(len(request.body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(request.body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = name.upper().replace('-', '_')
+            if key != 'CONTENT_TYPE':
+                key = f'HTTP_{key}'
+            environ[key] = value
+        status = []
+        response = self.application(
+            environ, lambda line, headers, exc_info=None: status.append(line)
+        )
+        try:
+            for _ in response:
+                pass
+        finally:
+            # close() шлёт request_finished, как у настоящего сервера.
+            response.close()
+        return int(status[0].split()[0])
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """Редирект - тоже ответ: клиент нагрузки по нему не переходит."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPTarget:
+    """Запущенный сервер по адресу base_url."""
+
+    def __init__(self, base_url):
+        self.opener = build_opener(NoRedirect)
+        self.base_url = base_url.rstrip('/')
+        self.name = self.base_url
+        parts = urlsplit(self.base_url)
+        self.host = parts.hostname
+        self.secure = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.secure else 80)
+
+    def send(self, request, timeout):
+        http_request = Request(
+            self.base_url + request.path,
+            data=request.body if request.method not in SAFE_METHODS else None,
+            headers=request.headers,
+            method=request.method,
+        )
+        try:
+            with self.opener.open(http_request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            error.close()
+            return error.code
+
+    async def send_async(self, request, timeout):
+        """Запрос HTTP/1.1 по сокету asyncio, без сторонних библиотек."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.secure),
+            timeout,
+        )
+        try:
+            lines = [
+                f'{request.method} {request.path} HTTP/1.1',
+                f'Host: {self.host}:{self.port}',
+                'Connection: close',
+                f'Content-Length: {len(request.body)}',
+            ]
+            lines += [
+                f'{name}: {value}' for name, value in request.headers.items()
+            ]
+            writer.write(
+                ('\r\n'.join(lines) + '\r\n\r\n').encode() + request.body
+            )
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            if not status_line:
+                raise ConnectionError('Сервер закрыл соединение без ответа.')
+            # Ответ дочитывается целиком, как у клиента в потоках.
+            await asyncio.wait_for(reader.read(), timeout)
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+
+class LoadTest:
+    """Прогоняет журнал через target и собирает сводку."""
+
+    def __init__(self, records, target, concurrency=10, mode='threads',
+                 duration=None, timeout=10):
+        if mode not in MODES:
+            raise ValueError(f'Неизвестный режим: {mode}')
+        if not records:
+            raise ValueError('В журнале нет запросов.')
+        self.target = target
+        self.concurrency = concurrency
+        self.mode = mode
+        self.duration = duration
+        self.timeout = timeout
+        sessions = login_cookies(
+            record['user'] for record in records if record['user']
+        )
+        self.requests = [
+            (route(record['path']), ReplayRequest(
+                record, sessions.get(record['user'])
+            ))
+            for record in records
+        ]
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def queue(self):
+        """Запросы по кругу до конца duration или журнал один раз."""
+        if self.duration is None:
+            return iter(self.requests)
+        deadline = time.perf_counter() + self.duration
+        return itertools.takewhile(
+            lambda _: time.perf_counter() < deadline,
+            itertools.cycle(self.requests),
+        )
+
+    def record(self, name, started, status=None, error=None):
+        with self.lock:
+            self.samples.append(
+                (name, time.perf_counter() - started, status, error)
+            )
+
+    def send(self, name, request):
+        started = time.perf_counter()
+        try:
+            status = self.target.send(request, self.timeout)
+        except Exception as error:
+            self.record(name, started, error=type(error).__name__)
+        else:
+            self.record(name, started, status)
+
+    def run(self):
+        self.samples = []
+        started = time.perf_counter()
+        if self.mode == 'threads':
+            self.run_threads()
+        else:
+            asyncio.run(self.run_asyncio())
+        return self.report(time.perf_counter() - started)
+
+    def run_threads(self):
+        queue = self.queue()
+
+        def worker():
+            while True:
+                with self.lock:
+                    item = next(queue, None)
+                if item is None:
+                    return
+                self.send(*item)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for _ in range(self.concurrency):
+                pool.submit(worker)
+
+    async def run_asyncio(self):
+        queue = self.queue()
+        send_async = getattr(self.target, 'send_async', None)
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+
+        async def worker():
+            for name, request in queue:
+                if send_async is None:
+                    await loop.run_in_executor(pool, self.send, name, request)
+                    continue
+                started = time.perf_counter()
+                try:
+                    status = await send_async(request, self.timeout)
+                except Exception as error:
+                    self.record(name, started, error=type(error).__name__)
+                else:
+                    self.record(name, started, status)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            pool.shutdown()
+
+    def report(self, seconds):
+        routes = defaultdict(list)
+        for sample in self.samples:
+            routes[sample[0]].append(sample)
+        result = {
+            'target': self.target.name,
+            'mode': self.mode,
+            'concurrency': self.concurrency,
+            'seconds': round(seconds, 3),
+            'throughput_rps': round(len(self.samples) / seconds, 1),
+            **summary(self.samples),
+        }
+        result['routes'] = {
+            name: summary(samples) for name, samples in sorted(routes.items())
+        }
+        return result
+
+
+def summary(samples):
+    """Задержки, статусы и доля ошибок; ошибка - 5xx или исключение."""
+    timings = [seconds for _, seconds, _, _ in samples]
+    statuses = Counter(
+        str(status) if status is not None else error
+        for _, _, status, error in samples
+    )
+    errors = sum(
+        1 for _, _, status, _ in samples if status is None or status >= 500
+    )
+    client_errors = sum(
+        1 for _, _, status, _ in samples
+        if status is not None and 400 <= status < 500
+    )
+    result = {'requests': len(samples)}
+    for share in PERCENTILES:
+        result[f'p{share}_ms'] = (
+            round(percentile(timings, share) * 1000, 3) if timings else None
+        )
+    result.update({
+        'statuses': dict(sorted(statuses.items())),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'client_errors': client_errors,
+    })
+    return result
@@ -0,0 +1,79 @@
+import json
+import multiprocessing
+import random
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+def run_worker(alias, keys, operations, seed, results):
+    """Имитирует воркер: читает ключ, при промахе кладёт его в кэш."""
+    cache = caches[alias]
+    rng = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f'cache_benchmark:{rng.randrange(keys)}'
+        if cache.get(key) is None:
+            cache.set(key, 'x' * 512)
+        else:
+            hits += 1
+        cache.incr('cache_benchmark:counter')
+    results.put({
+        'hits': hits,
+        'operations': operations,
+        'seconds': time.perf_counter() - started,
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий в кэш у нескольких процессов-воркеров. '
+        'С LocMemCache каждый воркер прогревает свою копию, с общим '
+        'бэкендом (sqlite, file, memcached, redis) - одну на всех.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--keys', type=int, default=200)
+        parser.add_argument('--operations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        alias = options['alias']
+        cache = caches[alias]
+        cache.clear()
+        cache.set('cache_benchmark:counter', 0, None)
+        # fork: воркеры наследуют настроенный Django, как у gunicorn.
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(target=run_worker, args=(
+                alias, options['keys'], options['operations'], seed, results
+            ))
+            for seed in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        stats = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        operations = sum(item['operations'] for item in stats)
+        hits = sum(item['hits'] for item in stats)
+        report = {
+            'alias': alias,
+            'backend': cache.__class__.__name__,
+            'workers': options['workers'],
+            'operations': operations,
+            'hit_rate': round(hits / operations, 4),
+            'ops_per_second': round(
+                operations / max(item['seconds'] for item in stats), 1
+            ),
+            # Для общего кэша счётчик равен числу операций всех воркеров.
+            'shared_counter': cache.get('cache_benchmark:counter'),
+            'per_worker_hit_rate': [
+                round(item['hits'] / item['operations'], 4) for item in stats
+            ],
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,151 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from core.backends.pool import PooledDatabaseWrapperMixin, pools
+from core.metrics import percentile
+from posts.models import Post
+
+User = get_user_model()
+connection = connections[DEFAULT_DB_ALIAS]
+USERNAME = 'connection_benchmark'
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет, какую долю времени запроса к страницам постов '
+        'занимает подключение к базе: новое соединение на каждый '
+        'запрос, постоянное соединение потока и пул соединений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+
+    def handle(self, *args, **options):
+        environs = self.prepare()
+        modes = {
+            'per_request': {'CONN_MAX_AGE': 0, 'MAX_SIZE': 0},
+            'persistent': {'CONN_MAX_AGE': None, 'MAX_SIZE': 0},
+        }
+        if isinstance(connection, PooledDatabaseWrapperMixin):
+            modes['pooled'] = {'CONN_MAX_AGE': 0, 'MAX_SIZE': 10}
+        saved = (
+            connection.settings_dict['CONN_MAX_AGE'],
+            dict(connection.settings_dict.get('POOL', {})),
+        )
+        try:
+            report = {
+                'vendor': connection.vendor,
+                'connect_ms': milliseconds(self.connect_time()),
+            }
+            for mode, mode_options in modes.items():
+                report[mode] = self.run(
+                    mode_options, environs, options['requests']
+                )
+        finally:
+            self.configure(*saved)
+        for mode in modes:
+            report[mode]['connect_share'] = round(
+                report[mode]['new_connections'] * report['connect_ms']
+                / report[mode]['total_ms'], 3
+            )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def configure(self, max_age, pool):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['POOL'] = pool
+        # Пул создаётся заново по новым настройкам.
+        old = pools.pop(connection.alias, None)
+        if old is not None:
+            old.clear()
+
+    def prepare(self):
+        """Окружения WSGI запросов залогиненного пользователя.
+
+        С сессией ответы не берутся из кэша анонимных страниц, и каждый
+        запрос доходит до базы.
+        """
+        user, _ = User.objects.get_or_create(username=USERNAME)
+        if not Post.objects.filter(author=user).exists():
+            Post.objects.create(author=user, text=USERNAME)
+        client = Client()
+        client.force_login(user)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        post = Post.objects.filter(author=user).first()
+        factory = RequestFactory(
+            HTTP_COOKIE=f'{settings.SESSION_COOKIE_NAME}={cookie}'
+        )
+        return [
+            factory.get(url).environ
+            for url in (
+                reverse('posts:index'),
+                reverse('posts:profile', args=[user.username]),
+                reverse('posts:post_detail', args=[post.pk]),
+            )
+        ]
+
+    def connect_time(self, times=50):
+        """Среднее время открытия нового соединения."""
+        self.configure(0, {'MAX_SIZE': 0})
+        total = 0
+        for _ in range(times):
+            started = time.perf_counter()
+            connection.ensure_connection()
+            total += time.perf_counter() - started
+            connection.close()
+        return total / times
+
+    def run(self, options, environs, requests):
+        self.configure(options['CONN_MAX_AGE'], {
+            **connection.settings_dict.get('POOL', {}),
+            'MAX_SIZE': options['MAX_SIZE'],
+        })
+        handler = WSGIHandler()
+        created = []
+
+        def count(sender, connection, **kwargs):
+            if not getattr(connection, 'connection_reused', False):
+                created.append(connection.alias)
+
+        # Прогрев: шаблоны, кэши и первое соединение.
+        for environ in environs:
+            self.request(handler, environ)
+        connection_created.connect(count)
+        try:
+            timings = [
+                self.request(handler, environs[number % len(environs)])
+                for number in range(requests)
+            ]
+        finally:
+            connection_created.disconnect(count)
+        return {
+            'requests': requests,
+            'total_ms': milliseconds(sum(timings)),
+            'mean_ms': milliseconds(sum(timings) / requests),
+            'p50_ms': milliseconds(percentile(timings, 50)),
+            'p95_ms': milliseconds(percentile(timings, 95)),
+            'new_connections': len(created),
+        }
+
+    def request(self, handler, environ):
+        started = time.perf_counter()
+        response = handler(dict(environ), lambda status, headers: None)
+        for _ in response:
+            pass
+        # close() шлёт request_finished: Django закрывает соединение
+        # или, с пулом, возвращает его в пул.
+        response.close()
+        return time.perf_counter() - started
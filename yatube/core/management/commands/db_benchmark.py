@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.backends.pool import pools
+from posts.models import Group, Post
+
+User = get_user_model()
+PREFIX = 'db_benchmark'
+# Настройки SQLite по умолчанию: журнал отката и полный fsync
+BASELINE_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+def run_client(client, urls, post_url, deadline, results):
+    """Гоняет запросы одного потока до deadline и копит статистику."""
+    stats = Counter()
+    number = 0
+    while time.perf_counter() < deadline:
+        try:
+            if post_url:
+                number += 1
+                response = client.post(
+                    post_url, {'text': f'{PREFIX} {number}'}
+                )
+            else:
+                response = client.get(urls[number % len(urls)])
+                number += 1
+        except Exception as error:
+            stats[type(error).__name__] += 1
+            continue
+        stats['writes' if post_url else 'reads'] += 1
+        if response.status_code >= 400:
+            stats[f'status {response.status_code}'] += 1
+    # Соединение потока Django само не закроет.
+    connections.close_all()
+    results.append(stats)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает страницы постов потоками читателей и писателей и '
+        'сравнивает пропускную способность SQLite с настройками по '
+        'умолчанию и с SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError('Нужна база SQLite в файле.')
+        users, urls = self.prepare(options['readers'], options['writers'])
+        modes = {
+            'baseline': BASELINE_PRAGMAS,
+            'tuned': settings.SQLITE_PRAGMAS,
+        }
+        report = {}
+        try:
+            for mode, pragmas in modes.items():
+                report[mode] = self.run(pragmas, users, urls, options)
+        finally:
+            Post.objects.filter(text__startswith=PREFIX).delete()
+        report['speedup'] = round(
+            report['tuned']['requests_per_second']
+            / max(report['baseline']['requests_per_second'], 1e-9), 2
+        )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def prepare(self, readers, writers):
+        group, _ = Group.objects.get_or_create(
+            slug=PREFIX, defaults={'title': PREFIX, 'description': PREFIX}
+        )
+        author, _ = User.objects.get_or_create(username=f'{PREFIX}_author')
+        if not Post.objects.filter(author=author).exists():
+            Post.objects.bulk_create([
+                Post(author=author, group=group, text=f'{PREFIX} {number}')
+                for number in range(50)
+            ])
+        users = {
+            role: [
+                User.objects.get_or_create(
+                    username=f'{PREFIX}_{role}_{number}'
+                )[0]
+                for number in range(count)
+            ]
+            for role, count in (('reader', readers), ('writer', writers))
+        }
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[group.slug]),
+            reverse('posts:profile', args=[author.username]),
+        ]
+        return users, urls
+
+    def run(self, pragmas, users, urls, options):
+        # Новые PRAGMA действуют на соединения, открытые после закрытия
+        # текущих и очистки пула; journal_mode к тому же записывается
+        # в сам файл базы.
+        connections.close_all()
+        for pool in pools.values():
+            pool.clear()
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            connection.ensure_connection()
+            connections.close_all()
+            results = []
+            threads = []
+            deadline = time.perf_counter() + options['seconds']
+            post_url = reverse('posts:post_create')
+            for role, role_users in users.items():
+                for user in role_users:
+                    client = Client()
+                    client.force_login(user)
+                    threads.append(threading.Thread(
+                        target=run_client,
+                        args=(
+                            client,
+                            urls,
+                            post_url if role == 'writer' else None,
+                            deadline,
+                            results,
+                        ),
+                    ))
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - started
+        total = sum(results, Counter())
+        requests = total['reads'] + total['writes']
+        return {
+            'pragmas': pragmas,
+            'reads': total['reads'],
+            'writes': total['writes'],
+            'requests_per_second': round(requests / seconds, 1),
+            'errors': {
+                name: count for name, count in total.items()
+                if name not in ('reads', 'writes')
+            },
+        }
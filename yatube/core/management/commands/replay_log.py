@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import MODES, HTTPTarget, LoadTest, WSGITarget, read_log
+
+
+class Command(BaseCommand):
+    help = (
+        'Воспроизводит журнал запросов (NDJSON или строки "GET /путь") '
+        'на WSGI-приложении проекта или на сервере по --url и выводит '
+        'JSON с пропускной способностью, задержками и долей ошибок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='Файл журнала.')
+        parser.add_argument(
+            '--url', help='Адрес сервера; без него - WSGI в этом процессе.'
+        )
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--mode', choices=MODES, default='threads')
+        parser.add_argument(
+            '--duration', type=float,
+            help='Секунд гонять журнал по кругу; без него - один проход.'
+        )
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--output', '-o', help='Файл для JSON.')
+        parser.add_argument(
+            '--max-error-rate', type=float,
+            help='Завершиться с ошибкой, если доля ошибок выше.'
+        )
+
+    def handle(self, *args, **options):
+        target = HTTPTarget(options['url']) if options['url'] else (
+            WSGITarget()
+        )
+        try:
+            result = LoadTest(
+                read_log(options['log']),
+                target,
+                concurrency=options['concurrency'],
+                mode=options['mode'],
+                duration=options['duration'],
+                timeout=options['timeout'],
+            ).run()
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        text = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text + '\n')
+        else:
+            self.stdout.write(text)
+        limit = options['max_error_rate']
+        if limit is not None and result['error_rate'] > limit:
+            raise CommandError(
+                f'Доля ошибок {result["error_rate"]} больше {limit}.'
+            )
@@ -0,0 +1,220 @@
+"""Метрики запросов: время, запросы к базе, шаблоны и кэш по view.
+
+Замеры одного запроса копятся в состоянии потока, а в конце запроса
+попадают в гистограммы с фиксированными корзинами. Обновление -
+несколько сложений под блокировкой, поэтому сбор можно не выключать
+в работе. Гистограммы живут в памяти процесса: у каждого воркера
+gunicorn свои, Prometheus собирает их с каждого воркера отдельно.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.utils.module_loading import import_string
+
+# Корзины гистограмм, верхние границы
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+HISTOGRAMS = {
+    'yatube_request_seconds': (
+        'Время обработки запроса', SECONDS_BUCKETS,
+    ),
+    'yatube_db_queries': ('Запросов к базе за запрос', QUERY_BUCKETS),
+    'yatube_db_seconds': ('Время запросов к базе', SECONDS_BUCKETS),
+    'yatube_template_seconds': ('Время рендера шаблонов', SECONDS_BUCKETS),
+}
+CACHE_COUNTER = 'yatube_cache_requests_total'
+RESPONSE_COUNTER = 'yatube_responses_total'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+state = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # {(метрика, view): Histogram}
+        self.histograms = {}
+        # {(метрика, метки): значение}
+        self.counters = Counter()
+
+    def record(self, view, status, measurement):
+        with self.lock:
+            for name, value in (
+                ('yatube_request_seconds', measurement.seconds),
+                ('yatube_db_queries', measurement.queries),
+                ('yatube_db_seconds', measurement.db_seconds),
+                ('yatube_template_seconds', measurement.template_seconds),
+            ):
+                histogram = self.histograms.get((name, view))
+                if histogram is None:
+                    histogram = self.histograms[(name, view)] = Histogram(
+                        HISTOGRAMS[name][1]
+                    )
+                histogram.observe(value)
+            self.counters[
+                (RESPONSE_COUNTER, (('view', view), ('status', str(status))))
+            ] += 1
+            for (cache, result), count in measurement.cache.items():
+                self.counters[(CACHE_COUNTER, (
+                    ('view', view), ('cache', cache), ('result', result),
+                ))] += count
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, view), histogram in histograms:
+                if metric != name:
+                    continue
+                view_label = f'view="{escape(view)}"'
+                total = 0
+                for bound, count in zip(
+                    (*buckets, '+Inf'), histogram.counts
+                ):
+                    total += count
+                    lines.append(
+                        f'{name}_bucket{{{view_label},le="{bound}"}} {total}'
+                    )
+                lines.append(f'{name}_sum{{{view_label}}} {histogram.sum}')
+                lines.append(
+                    f'{name}_count{{{view_label}}} {histogram.count}'
+                )
+        for name, help_text in (
+            (RESPONSE_COUNTER, 'Ответы по view и статусу'),
+            (CACHE_COUNTER, 'Обращения к кэшу по view, алиасу и результату'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in counters:
+                if metric == name:
+                    text = ','.join(
+                        f'{key}="{escape(label)}"' for key, label in labels
+                    )
+                    lines.append(f'{name}{{{text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def percentile(values, share):
+    """Перцентиль share (от 0 до 100) по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def escape(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+registry = Registry()
+
+
+class Measurement:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.seconds = 0
+        self.queries = 0
+        self.db_seconds = 0
+        self.template_seconds = 0
+        # {(алиас кэша, hit или miss): число обращений}
+        self.cache = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка execute_wrapper, считающая запросы к базе."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(state, 'measurement', None)
+
+
+def record_template_time(seconds):
+    measurement = current()
+    if measurement is not None:
+        measurement.template_seconds += seconds
+
+
+def record_cache(alias, hit):
+    measurement = current()
+    if measurement is not None:
+        measurement.cache[(alias, 'hit' if hit else 'miss')] += 1
+
+
+class InstrumentedCache:
+    """Бэкенд кэша, который считает попадания и промахи чтений.
+
+    Оборачивает один алиас: настоящий бэкенд задаётся параметром
+    WRAPPED_BACKEND, его класс и другие алиасы не меняются. Алиас
+    в метриках берётся из KEY_PREFIX, который совпадает с ним
+    в cache_settings(). Остальные методы уходят бэкенду как есть.
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        backend = import_string(params.pop('WRAPPED_BACKEND'))
+        self.alias = params.get('KEY_PREFIX') or 'default'
+        self.cache = backend(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        value = self.cache.get(key, missing, version=version)
+        record_cache(self.alias, value is not missing)
+        return default if value is missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self.cache.get_many(keys, version=version)
+        for key in keys:
+            record_cache(self.alias, key in values)
+        return values
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        value = self.get(key, version=version)
+        if value is None:
+            value = self.cache.get_or_set(
+                key, default, timeout=timeout, version=version
+            )
+        return value
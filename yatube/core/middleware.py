@@ -0,0 +1,226 @@
+"""Промежуточные слои: метрики, проверка запросов к базе, кэш страниц
+и выбор базы для чтения.
+
+Ответ анонимному посетителю хранится по адресу с параметрами и версии
+пути: изменение данных увеличивает версию пути через invalidate_pages(),
+и все закэшированные варианты страницы (?page=, ?cursor=) устаревают
+разом. Вместе с ответом хранятся версии лент, из которых view его
+собрала (request.feed_versions): ответ устаревает и когда меняется
+любая из них, например после готовности миниатюр или нового поста
+автора на страницах его других постов.
+"""
+import hashlib
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import escape_uri_path
+
+from . import metrics
+from .db import replicas, unpin_request, use_primary
+from .queries import QueryInspector
+
+PAGE_VERSION_KEY = 'page_version:{}'
+PAGE_KEY = 'page:{}:{}'
+CACHE_HEADER = 'X-Cache'
+HIT = 'HIT'
+MISS = 'MISS'
+BYPASS = 'BYPASS'
+PRIMARY_COOKIE = 'primary_db'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# Метка view для адресов, которые не разрешились
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+def page_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def page_version(path):
+    return page_cache().get_or_set(
+        PAGE_VERSION_KEY.format(path), time.time_ns()
+    )
+
+
+def invalidate_pages(paths):
+    """Сбрасывает закэшированные ответы для путей вместе с параметрами.
+
+    None в paths пропускается.
+    """
+    cache = page_cache()
+    for path in set(paths) - {None}:
+        try:
+            cache.incr(PAGE_VERSION_KEY.format(path))
+        except ValueError:
+            # Версии нет - страницу ещё никто не кэшировал.
+            pass
+
+
+class MetricsMiddleware:
+    """Замеряет запрос и записывает его в гистограммы его view.
+
+    Стоит первым, чтобы учитывать и ответы из кэша страниц: их
+    попадания видны в метриках как cache="pages".
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measurement = metrics.Measurement()
+        metrics.state.measurement = measurement
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(measurement)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.state.measurement = None
+        measurement.seconds = time.perf_counter() - started
+        metrics.registry.record(
+            self.view_name(request), response.status_code, measurement
+        )
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Ответ из кэша страниц не доходит до разрешения адреса.
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return UNRESOLVED_VIEW
+        return match.view_name
+
+
+class QueryInspectionMiddleware:
+    """Ищет медленные запросы и N+1 в запросах к view."""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inspector = QueryInspector(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(inspector))
+            response = self.get_response(request)
+        inspector.report()
+        return response
+
+
+class AnonymousCacheMiddleware:
+    """Отдаёт анонимам GET-страницы из ANONYMOUS_CACHE_VIEWS из кэша.
+
+    Посетитель с cookie сессии обходит кэш: ему может понадобиться
+    страница с его именем, формами и подписками. Заголовок X-Cache
+    показывает HIT, MISS или BYPASS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cached_view(request):
+            return self.get_response(request)
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            response = self.get_response(request)
+            response[CACHE_HEADER] = BYPASS
+            return response
+        digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        # request.path раскодирован, а invalidate_pages() получает
+        # адреса из reverse() в %-кодировке: ключ версии строится
+        # по кодированному пути, иначе не-ASCII адреса не сбросятся.
+        path = escape_uri_path(request.path)
+        key = PAGE_KEY.format(page_version(path), digest)
+        cache = page_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            versions, response = cached
+            if self.is_current(versions):
+                response = get_conditional_response(
+                    request, etag=response.get('ETag'), response=response
+                )
+                response[CACHE_HEADER] = HIT
+                return response
+        response = self.get_response(request)
+        if self.is_cacheable(response):
+            cache.set(
+                key, (getattr(request, 'feed_versions', {}), response)
+            )
+        response[CACHE_HEADER] = MISS
+        return response
+
+    def is_cached_view(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.ANONYMOUS_CACHE_VIEWS
+
+    def is_current(self, versions):
+        """Не сменились ли версии лент с тех пор, как ответ сохранён."""
+        if not versions:
+            return True
+        return caches[settings.FEED_CACHE_ALIAS].get_many(
+            list(versions)
+        ) == versions
+
+    def is_cacheable(self, response):
+        # Ответы с cookie личные: их нельзя отдавать другим посетителям.
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+
+class ReadYourWritesMiddleware:
+    """Читает с основной базы во время записи и несколько секунд после.
+
+    Реплика отстаёт от основной базы, и без этого автор мог бы не
+    увидеть свой пост сразу после публикации. Запрос, который меняет
+    данные, ставит cookie на REPLICA_STICKY_SECONDS; пока она жива,
+    все чтения посетителя идут в основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.route(request)
+        finally:
+            # Закрепление за основной базой из pin_request() живёт
+            # до конца запроса.
+            unpin_request()
+
+    def route(self, request):
+        writes = request.method not in SAFE_METHODS
+        if not writes and PRIMARY_COOKIE not in request.COOKIES:
+            return self.get_response(request)
+        with use_primary():
+            response = self.get_response(request)
+        if writes and replicas():
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
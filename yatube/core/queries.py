@@ -0,0 +1,107 @@
+"""Журнал медленных запросов и поиск N+1 в пределах одного запроса.
+
+Каждый SQL-запрос сводится к форме: значения заменяются на ?, списки
+IN - на (...). Если одна форма повторилась REPEATED_QUERY_THRESHOLD
+раз, это почти наверняка запрос в цикле по строкам - N+1. Такие
+формы и запросы дольше SLOW_QUERY_SECONDS пишутся в лог вместе
+с view, шаблоном и строкой кода проекта, откуда пришёл запрос.
+Место ищется по стеку только для попавших в лог запросов.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:''|[^'])*'|\b\d+(?:\.\d+)?\b|%s")
+IN_LISTS = re.compile(r'IN \((?:\?, )*\?\)')
+TEMPLATE_RENDER = Template.render.__code__
+# Кадры проверки запросов при поиске места в коде пропускаются
+SKIPPED_FILES = tuple(
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('queries.py', 'middleware.py')
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """View выполнила больше запросов, чем разрешено QUERY_BUDGETS."""
+
+
+def query_shape(sql):
+    return IN_LISTS.sub('IN (...)', LITERALS.sub('?', sql))
+
+
+def origin():
+    """Шаблон, который сейчас рендерится, и строка кода проекта."""
+    template = None
+    location = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or location is None):
+        code = frame.f_code
+        if template is None and code is TEMPLATE_RENDER:
+            template = frame.f_locals['self'].name
+        if (
+            location is None
+            and code.co_filename.startswith(settings.BASE_DIR)
+            and not code.co_filename.startswith(SKIPPED_FILES)
+        ):
+            location = f'{code.co_filename}:{frame.f_lineno}'
+        frame = frame.f_back
+    return template, location
+
+
+class QueryInspector:
+    """Обёртка execute_wrapper для одного HTTP-запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self.shapes = Counter()
+        # {форма: (шаблон, место)} для форм, похожих на N+1
+        self.repeated = {}
+        self.queries = 0
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else self.request.path
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.queries += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == settings.REPEATED_QUERY_THRESHOLD:
+                self.repeated[shape] = origin()
+            if seconds >= settings.SLOW_QUERY_SECONDS:
+                template, location = origin()
+                logger.warning(
+                    'Медленный запрос %.3f с во view %s, шаблон %s, %s: %s',
+                    seconds, self.view_name(), template, location, sql,
+                )
+
+    def report(self):
+        """Пишет в лог формы, похожие на N+1, и проверяет бюджет."""
+        view = self.view_name()
+        for shape, (template, location) in self.repeated.items():
+            logger.warning(
+                'Запрос повторился %d раз во view %s, шаблон %s, %s: %s',
+                self.shapes[shape], view, template, location, shape,
+            )
+        budget = settings.QUERY_BUDGETS.get(view)
+        if (
+            settings.QUERY_BUDGET_ENFORCED
+            and budget is not None
+            and self.queries > budget
+        ):
+            raise QueryBudgetExceeded(
+                f'{view}: {self.queries} запросов при бюджете {budget}'
+            )
@@ -0,0 +1,45 @@
+"""Запуск тестов с кэшами во временном каталоге.
+
+Алиасы на SQLite и файлах по умолчанию лежат в общем CACHE_DIR, и без
+подмены тесты писали бы в тот же кэш, что и запущенный рядом сервер.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+FILE_BACKENDS = (
+    'core.cache.SQLiteCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+)
+
+
+def isolated_caches(directory):
+    """CACHES, где файловые алиасы перенесены в каталог directory."""
+    caches = copy.deepcopy(settings.CACHES)
+    for options in caches.values():
+        backend = options.get('WRAPPED_BACKEND', options['BACKEND'])
+        if backend in FILE_BACKENDS:
+            options['LOCATION'] = os.path.join(
+                directory, os.path.basename(options['LOCATION'])
+            )
+    return caches
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp(prefix='yatube-cache-')
+        self.cache_settings = override_settings(
+            CACHES=isolated_caches(self.cache_directory)
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,91 @@
+import multiprocessing
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from ..cache import SQLiteCache
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(self.location, {'TIMEOUT': 60})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'другое'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'другое'))
+
+    def test_expired_value_is_missing(self):
+        self.cache.set('key', 'value', timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('key')
+
+    def test_shared_between_instances(self):
+        """Разные экземпляры (как разные воркеры) видят одни записи."""
+        SQLiteCache(self.location, {}).set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_cull_keeps_max_entries(self):
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {
+                'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 1,
+            }
+        })
+        for i in range(30):
+            cache.set(f'key{i}', i)
+        self.assertLessEqual(
+            sum(cache.has_key(f'key{i}') for i in range(30)), 11)
+
+    def test_cull_runs_every_nth_write(self):
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {
+                'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 20,
+            }
+        })
+        for i in range(19):
+            cache.set(f'key{i}', i)
+        self.assertEqual(
+            sum(cache.has_key(f'key{i}') for i in range(19)), 19)
+        cache.set('key19', 19)
+        self.assertLessEqual(
+            sum(cache.has_key(f'key{i}') for i in range(20)), 10)
+
+
+class TestCacheLocationTests(SimpleTestCase):
+    def test_tests_do_not_share_server_cache(self):
+        for alias in (settings.FEED_CACHE_ALIAS, settings.PAGE_CACHE_ALIAS,
+                      settings.SESSION_CACHE_ALIAS):
+            with self.subTest(alias=alias):
+                self.assertFalse(settings.CACHES[alias]['LOCATION'].startswith(
+                    settings.CACHE_DIR
+                ))
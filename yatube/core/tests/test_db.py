@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, router
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.feeds import (FEED_BUMPED_KEY, INDEX_FEED, bump_feed_versions,
+                         feed_key, page_etag)
+from posts.models import Post
+
+from ..db import pin_request, pinned, unpin_request, use_primary
+from ..middleware import PRIMARY_COOKIE, ReadYourWritesMiddleware
+
+User = get_user_model()
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.settings_dict = {
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+        }
+
+    def pragma(self, settings_dict, name):
+        wrapper = DatabaseWrapper(settings_dict, alias='pragma_test')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'wal', 'busy_timeout': 1234, 'cache_size': -2000,
+    })
+    def test_settings_apply_to_new_connection(self):
+        for name, value in (
+            ('journal_mode', 'wal'),
+            ('busy_timeout', 1234),
+            ('cache_size', -2000),
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(self.pragma(self.settings_dict, name), value)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_database_overrides_common_pragmas(self):
+        self.settings_dict['PRAGMAS'] = {'busy_timeout': 10}
+        self.assertEqual(self.pragma(self.settings_dict, 'busy_timeout'), 10)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_replica(self):
+        self.assertEqual(router.db_for_read(Post), 'replica')
+        self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+
+    def test_use_primary(self):
+        with use_primary():
+            with use_primary():
+                self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(Post), 'replica')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=7)
+class ReadYourWritesMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.pinned = None
+
+        def view(request):
+            self.pinned = pinned()
+            return HttpResponse()
+
+        self.middleware = ReadYourWritesMiddleware(view)
+
+    def test_write_reads_primary_and_sets_cookie(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertTrue(self.pinned)
+        self.assertFalse(pinned())
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]['max-age'], 7)
+
+    def test_read_after_write_stays_on_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = '1'
+        response = self.middleware(request)
+        self.assertTrue(self.pinned)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_plain_read_uses_replica(self):
+        response = self.middleware(self.factory.get('/'))
+        self.assertFalse(self.pinned)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_request_pin_ends_with_request(self):
+        def view(request):
+            pin_request()
+            self.pinned = pinned()
+            return HttpResponse()
+
+        ReadYourWritesMiddleware(view)(self.factory.get('/'))
+        self.assertTrue(self.pinned)
+        self.assertFalse(pinned())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_cookie_without_replicas(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadYourWritesViewTests(TestCase):
+    def test_new_post_sets_cookie(self):
+        client = Client()
+        client.force_login(User.objects.create_user(username='author'))
+        response = client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertTrue(Post.objects.filter(text='Пост').exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=7)
+class FreshFeedTests(SimpleTestCase):
+    """Страницу ленты сразу после её смены читают с основной базы."""
+
+    def setUp(self):
+        caches[settings.FEED_CACHE_ALIAS].clear()
+        self.addCleanup(unpin_request)
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def test_recently_bumped_feed_reads_primary(self):
+        bump_feed_versions([feed_key(INDEX_FEED)])
+        page_etag(self.request, (INDEX_FEED, None))
+        self.assertTrue(pinned())
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_settled_feed_reads_replica(self):
+        bump_feed_versions([feed_key(INDEX_FEED)])
+        caches[settings.FEED_CACHE_ALIAS].delete(
+            FEED_BUMPED_KEY.format(feed_key(INDEX_FEED))
+        )
+        page_etag(self.request, (INDEX_FEED, None))
+        self.assertFalse(pinned())
+        self.assertEqual(router.db_for_read(Post), 'replica')
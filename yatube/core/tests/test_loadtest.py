@@ -0,0 +1,164 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import (LiveServerTestCase, SimpleTestCase, TestCase,
+                         override_settings)
+
+from posts.models import Comment, Post
+
+from ..loadtest import (HTTPTarget, LoadTest, ReplayRequest, WSGITarget,
+                        read_log)
+
+User = get_user_model()
+# Страницы без запросов к базе: их можно гонять из нескольких потоков
+# поверх тестовой базы в памяти.
+LOG = [
+    {'path': '/about/author/'},
+    {'path': '/about/tech/'},
+    {'path': '/no-such-page/'},
+]
+
+
+def write_log(lines):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'requests.log')
+    with open(path, 'w', encoding='utf-8') as log:
+        log.write('\n'.join(lines) + '\n')
+    return directory, path
+
+
+def read_log_records(lines):
+    directory, path = write_log([json.dumps(line) for line in lines])
+    try:
+        return read_log(path)
+    finally:
+        shutil.rmtree(directory)
+
+
+class ReadLogTests(SimpleTestCase):
+    def test_formats(self):
+        directory, path = write_log([
+            json.dumps({'path': '/posts/1/', 'user': 'leo'}),
+            json.dumps({
+                'method': 'post', 'url': 'http://example.com/create/?a=1',
+                'data': {'text': 'Пост'},
+            }),
+            'GET /group/cats/',
+            '/follow/',
+            '',
+        ])
+        self.addCleanup(shutil.rmtree, directory)
+        records = read_log(path)
+        self.assertEqual(
+            [(record['method'], record['path']) for record in records],
+            [
+                ('GET', '/posts/1/'),
+                ('POST', '/create/?a=1'),
+                ('GET', '/group/cats/'),
+                ('GET', '/follow/'),
+            ]
+        )
+        self.assertEqual(records[0]['user'], 'leo')
+        self.assertEqual(records[1]['data'], {'text': 'Пост'})
+
+    def test_record_without_path(self):
+        directory, path = write_log([json.dumps({'method': 'GET'})])
+        self.addCleanup(shutil.rmtree, directory)
+        with self.assertRaises(ValueError):
+            read_log(path)
+
+
+class FailingTarget:
+    name = 'failing'
+
+    def send(self, request, timeout):
+        raise ConnectionError
+
+
+class LoadTestTests(TestCase):
+    def records(self, repeat=3):
+        return read_log_records(LOG * repeat)
+
+    def test_wsgi_threads_and_asyncio(self):
+        for mode in ('threads', 'asyncio'):
+            with self.subTest(mode=mode):
+                result = LoadTest(
+                    self.records(), WSGITarget(), concurrency=3, mode=mode
+                ).run()
+                self.assertEqual(result['requests'], 9)
+                self.assertEqual(result['statuses'], {'200': 6, '404': 3})
+                self.assertEqual(result['client_errors'], 3)
+                self.assertEqual(result['error_rate'], 0)
+                self.assertEqual(
+                    set(result['routes']),
+                    {'about:author', 'about:tech', '/no-such-page/'}
+                )
+                self.assertGreater(result['throughput_rps'], 0)
+
+    def test_exceptions_are_errors(self):
+        result = LoadTest(self.records(1), FailingTarget()).run()
+        self.assertEqual(result['errors'], 3)
+        self.assertEqual(result['error_rate'], 1)
+        self.assertEqual(result['statuses'], {'ConnectionError': 3})
+
+    def test_duration_loops_over_log(self):
+        result = LoadTest(
+            self.records(1), WSGITarget(), concurrency=1, duration=0.2
+        ).run()
+        self.assertGreater(result['requests'], 3)
+
+    def test_logged_in_post(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        test = LoadTest(read_log_records([{
+            'method': 'POST',
+            'path': f'/posts/{post.pk}/comment/',
+            'user': 'author',
+            'data': {'text': 'Комментарий'},
+        }]), WSGITarget())
+        # В этом же потоке: транзакция теста видна запросу.
+        self.assertEqual(WSGITarget().send(test.requests[0][1], 10), 302)
+        self.assertTrue(Comment.objects.filter(
+            post=post, author=author, text='Комментарий'
+        ).exists())
+
+    def test_command(self):
+        directory, path = write_log([json.dumps(line) for line in LOG])
+        self.addCleanup(shutil.rmtree, directory)
+        output = io.StringIO()
+        call_command(
+            'replay_log', path, concurrency=2, max_error_rate=0,
+            stdout=output,
+        )
+        self.assertEqual(json.loads(output.getvalue())['requests'], 3)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class HTTPTargetTests(LiveServerTestCase):
+    def test_threads_and_asyncio(self):
+        for mode in ('threads', 'asyncio'):
+            with self.subTest(mode=mode):
+                result = LoadTest(
+                    read_log_records(LOG * 2),
+                    HTTPTarget(self.live_server_url),
+                    concurrency=2,
+                    mode=mode,
+                ).run()
+                self.assertEqual(result['statuses'], {'200': 4, '404': 2})
+                self.assertEqual(result['target'], self.live_server_url)
+
+
+class ReplayRequestTests(SimpleTestCase):
+    def test_csrf_token_for_unsafe_methods(self):
+        request = ReplayRequest({
+            'method': 'POST', 'path': '/', 'data': {'text': 'а'},
+        }, session='key')
+        cookie = request.headers['Cookie']
+        self.assertIn('sessionid=key', cookie)
+        self.assertIn(f'csrftoken={request.headers["X-CSRFToken"]}', cookie)
+        self.assertEqual(request.body, b'text=%D0%B0')
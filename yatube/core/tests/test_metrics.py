@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from posts.models import Post
+
+from ..metrics import Histogram, Measurement, Registry, registry
+
+User = get_user_model()
+
+
+class RegistryTests(SimpleTestCase):
+    def test_histogram_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 100):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual((histogram.sum, histogram.count), (104, 4))
+
+    def test_prometheus_text(self):
+        measurement = Measurement()
+        measurement.queries = 3
+        measurement.cache[('feeds', 'hit')] = 2
+        registry = Registry()
+        registry.record('posts:index', 200, measurement)
+        registry.record('posts:index', 200, Measurement())
+        text = registry.render()
+        self.assertIn('# TYPE yatube_db_queries histogram', text)
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="2"} 1', text
+        )
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="+Inf"} 2', text
+        )
+        self.assertIn('yatube_db_queries_sum{view="posts:index"} 3', text)
+        self.assertIn(
+            'yatube_responses_total{view="posts:index",status="200"} 2', text
+        )
+        self.assertIn(
+            'yatube_cache_requests_total'
+            '{view="posts:index",cache="feeds",result="hit"} 2',
+            text
+        )
+
+
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        registry.clear()
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+        self.addCleanup(registry.clear)
+
+    def metric(self, name, view):
+        histogram = registry.histograms[(name, view)]
+        return histogram.count, histogram.sum
+
+    def test_request_is_measured(self):
+        Client().get(reverse('posts:profile', args=[self.author.username]))
+        count, seconds = self.metric('yatube_request_seconds', 'posts:profile')
+        self.assertEqual(count, 1)
+        self.assertGreater(seconds, 0)
+        self.assertGreater(
+            self.metric('yatube_db_queries', 'posts:profile')[1], 0
+        )
+        self.assertGreater(
+            self.metric('yatube_template_seconds', 'posts:profile')[1], 0
+        )
+
+    def test_page_cache_hits_are_counted(self):
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('posts:index'))
+        self.assertEqual(
+            self.metric('yatube_request_seconds', 'posts:index')[0], 2
+        )
+        # Ответ из кэша не рендерит шаблон и не ходит в базу.
+        self.assertEqual(
+            registry.histograms[
+                ('yatube_db_queries', 'posts:index')
+            ].counts[0], 1
+        )
+        self.assertGreater(registry.counters[(
+            'yatube_cache_requests_total',
+            (('view', 'posts:index'), ('cache', 'pages'), ('result', 'hit')),
+        )], 0)
+
+    def test_unknown_url(self):
+        Client().get('/no-such-page/')
+        self.assertIn(
+            ('yatube_request_seconds', '<unresolved>'), registry.histograms
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_token(self):
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('core:metrics')
+        self.assertEqual(client.get(url).status_code, 403)
+        self.assertEqual(
+            client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code,
+            403
+        )
+        client.get(reverse('posts:index'))
+        response = Client().get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertContains(
+            response, 'yatube_request_seconds_count{view="posts:index"} 1'
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='')
+    def test_endpoint_allows_listed_addresses(self):
+        url = reverse('core:metrics')
+        self.assertEqual(
+            Client(REMOTE_ADDR='10.0.0.5').get(url).status_code, 200
+        )
+        self.assertEqual(Client().get(url).status_code, 403)
+        # Пустой токен не открывает страницу.
+        self.assertEqual(
+            Client().get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403
+        )
+
+    def test_endpoint_allows_staff(self):
+        url = reverse('core:metrics')
+        # Адрес по умолчанию не открывает страницу: за прокси он у всех.
+        self.assertEqual(
+            Client(REMOTE_ADDR='127.0.0.1').get(url).status_code, 403
+        )
+        client = Client()
+        client.force_login(self.staff)
+        self.assertEqual(client.get(url).status_code, 200)
+
+    def test_cache_instrumentation_is_per_alias(self):
+        cache = caches[settings.FEED_CACHE_ALIAS]
+        self.assertEqual(cache.alias, settings.FEED_CACHE_ALIAS)
+        self.assertIsInstance(cache.cache, import_string(
+            settings.CACHES[settings.FEED_CACHE_ALIAS]['WRAPPED_BACKEND']
+        ))
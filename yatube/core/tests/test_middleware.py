@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+from posts.thumbnails import refresh_feeds
+
+User = get_user_model()
+
+
+class AnonymousCacheMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+        self.client = Client()
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+
+    def test_second_request_is_served_from_cache(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+                response = self.client.get(url)
+                self.assertEqual(response['X-Cache'], 'HIT')
+                self.assertIsNone(response.context)
+
+    def test_query_string_is_part_of_key(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_post_change_invalidates_its_pages(self):
+        for url in self.urls():
+            self.client.get(url, {'page': 1})
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url, {'page': 1})
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertContains(response, 'Исправленный пост')
+
+    def test_non_ascii_profile_is_invalidated(self):
+        user = User.objects.create_user(username='Иван', first_name='Иван')
+        Post.objects.create(author=user, text='Пост Ивана')
+        url = reverse('posts:profile', args=[user.username])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        user.first_name = 'Иоанн'
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Иоанн')
+
+    def test_comment_invalidates_post_page(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.assertContains(self.client.get(url), 'Комментарий')
+
+    def test_new_post_invalidates_authors_other_post_pages(self):
+        """Счётчик постов автора на страницах его постов обновляется."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Второй пост')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_ready_thumbnails_invalidate_pages(self):
+        """Готовые миниатюры заменяют заглушку и в кэше страниц."""
+        for url in self.urls():
+            self.client.get(url)
+        image = 'posts/ab/cd/abcd.jpg'
+        Post.objects.filter(pk=self.post.pk).update(image=image)
+        refresh_feeds(image)
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_session_cookie_bypasses_cache(self):
+        self.client.force_login(self.author)
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'BYPASS')
+
+    def test_other_pages_are_not_cached(self):
+        response = self.client.get(reverse('about:author'))
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_cached_page_answers_conditional_get(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Cache'], 'HIT')
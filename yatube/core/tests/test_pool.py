@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from ..backends.pool import pools
+from ..backends.sqlite3.base import DatabaseWrapper
+
+ALIAS = 'pool_test'
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(self.clear_pool)
+        self.settings_dict = {
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+            'CONN_MAX_AGE': 0,
+            'POOL': {'MAX_SIZE': 2, 'MAX_LIFETIME': 600},
+        }
+
+    def clear_pool(self):
+        pool = pools.pop(ALIAS, None)
+        if pool is not None:
+            pool.clear()
+
+    def wrapper(self):
+        wrapper = DatabaseWrapper(self.settings_dict, alias=ALIAS)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def raw_connection(self, wrapper):
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close()
+        return raw
+
+    def test_closed_connection_is_reused(self):
+        first = self.raw_connection(self.wrapper())
+        # Другая обёртка - как другой поток или следующий запрос.
+        wrapper = self.wrapper()
+        self.assertIs(self.raw_connection(wrapper), first)
+        self.assertTrue(wrapper.connection_reused)
+        self.assertEqual(wrapper.pool.stats['created'], 1)
+        self.assertEqual(wrapper.pool.stats['reused'], 1)
+
+    def test_reused_connection_works(self):
+        wrapper = self.wrapper()
+        self.raw_connection(wrapper)
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_old_connection_is_recycled(self):
+        self.settings_dict['POOL']['MAX_LIFETIME'] = 0
+        first = self.raw_connection(self.wrapper())
+        wrapper = self.wrapper()
+        self.assertIsNot(self.raw_connection(wrapper), first)
+        self.assertEqual(wrapper.pool.stats['recycled'], 1)
+
+    def test_broken_connection_is_replaced(self):
+        first = self.raw_connection(self.wrapper())
+        first.close()
+        wrapper = self.wrapper()
+        self.assertIsNot(self.raw_connection(wrapper), first)
+        self.assertEqual(wrapper.pool.stats['broken'], 1)
+
+    def test_pool_keeps_at_most_max_size(self):
+        wrappers = [self.wrapper() for _ in range(3)]
+        for wrapper in wrappers:
+            wrapper.ensure_connection()
+        for wrapper in wrappers:
+            wrapper.close()
+        pool = wrappers[0].pool
+        self.assertEqual(len(pool.idle), 2)
+        self.assertEqual(pool.stats['discarded'], 1)
+
+    def test_disabled_pool(self):
+        self.settings_dict['POOL']['MAX_SIZE'] = 0
+        first = self.raw_connection(self.wrapper())
+        self.assertIsNot(self.raw_connection(self.wrapper()), first)
+
+    def test_uncommitted_changes_are_rolled_back(self):
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER)')
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO item VALUES (1)')
+        wrapper.close()
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..middleware import QueryInspectionMiddleware
+from ..queries import QueryBudgetExceeded, query_shape
+
+User = get_user_model()
+
+
+@override_settings(
+    QUERY_INSPECTION=True,
+    REPEATED_QUERY_THRESHOLD=3,
+    SLOW_QUERY_SECONDS=10,
+)
+class QueryInspectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.posts = [
+            Post.objects.create(
+                author=User.objects.create_user(username=f'user{number}'),
+                text=f'Пост {number}',
+            )
+            for number in range(3)
+        ]
+
+    def inspect(self, view):
+        def get_response(request):
+            view()
+            return HttpResponse()
+
+        return QueryInspectionMiddleware(get_response)(
+            RequestFactory().get('/')
+        )
+
+    def get_profile(self):
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+        caches[settings.FEED_CACHE_ALIAS].clear()
+        return Client().get(
+            reverse('posts:profile', args=[self.posts[0].author.username])
+        )
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape(
+                "SELECT a FROM t WHERE id IN (%s, %s) AND x = 'y' LIMIT 21"
+            ),
+            'SELECT a FROM t WHERE id IN (...) AND x = ? LIMIT ?'
+        )
+
+    def test_repeated_query_in_template(self):
+        template = Template(
+            '{% for post in posts %}{{ post.author.username }}{% endfor %}',
+            name='feed.html',
+        )
+        posts = list(Post.objects.all())
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.inspect(lambda: template.render(Context({'posts': posts})))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('повторился 3 раз', logs.output[0])
+        self.assertIn('шаблон feed.html', logs.output[0])
+        self.assertIn('auth_user', logs.output[0])
+
+    def test_different_queries_are_not_reported(self):
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('core.queries', 'WARNING'):
+                self.inspect(lambda: list(
+                    Post.objects.select_related('author')
+                ))
+
+    @override_settings(SLOW_QUERY_SECONDS=0)
+    def test_slow_query(self):
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.inspect(lambda: Post.objects.count())
+        self.assertIn('Медленный запрос', logs.output[0])
+        self.assertIn('test_queries.py', logs.output[0])
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:profile': 2}, QUERY_BUDGET_ENFORCED=True
+    )
+    def test_query_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.get_profile()
+
+    @override_settings(QUERY_BUDGETS={'posts:profile': 2})
+    def test_query_budget_is_optional(self):
+        self.assertEqual(self.get_profile().status_code, 200)
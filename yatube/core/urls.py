@@ -1,3 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('metrics/', views.metrics, name='metrics'),
+]
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
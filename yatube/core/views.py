@@ -1,5 +1,11 @@
 # core/views.py
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import CONTENT_TYPE, registry
 
 
 def page_not_found(request, exception):
@@ -18,3 +24,26 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_allowed(request):
+    """Пускает сотрудников, запросы с METRICS_TOKEN и METRICS_ALLOWED_IPS."""
+    if request.user.is_staff:
+        return True
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.META.get(
+        'HTTP_AUTHORIZATION', ''
+    ).partition(' ')
+    return bool(
+        settings.METRICS_TOKEN
+        and scheme.lower() == 'bearer'
+        and constant_time_compare(token, settings.METRICS_TOKEN)
+    )
+
+
+def metrics(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    if not metrics_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -1,9 +1,20 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import filter_comments, filter_posts
 
 
-class PostAdmin(admin.ModelAdmin):
+class IndexedSearchMixin:
+    """Поиск в админке через полнотекстовый индекс вместо LIKE."""
+    search_filter = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return self.search_filter(queryset, search_term), False
+
+
+class PostAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -13,6 +24,7 @@ class PostAdmin(admin.ModelAdmin):
     )
     list_editable = ('group',)
     search_fields = ('text',)
+    search_filter = staticmethod(filter_posts)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
@@ -27,7 +39,7 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = (
         'post',
         'author',
@@ -35,6 +47,7 @@ class CommentAdmin(admin.ModelAdmin):
         'created'
     )
     search_fields = ('text',)
+    search_filter = staticmethod(filter_comments)
     empty_value_display = '-пусто-'
 
 
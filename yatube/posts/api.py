@@ -0,0 +1,204 @@
+"""JSON API лент, постов, комментариев и подписок.
+
+Записи сериализуются из values(): в ответ попадают только нужные
+колонки, объекты моделей не создаются. Ленты и комментарии
+листаются курсором, как и HTML-страницы.
+"""
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_http_methods
+
+from .forms import CommentForm
+from .models import Comment, Follow, Group, Post, User
+from .paginators import COMMENTS_PER_PAGE, TEN, CursorPaginator
+from .storage import post_image_storage
+from .timeline import follow_page
+
+POST_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'image',
+    'comments_count',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+    'group__title',
+)
+COMMENT_FIELDS = (
+    'id',
+    'post_id',
+    'text',
+    'created',
+    'author__username',
+)
+
+
+def api_login_required(view):
+    """Как login_required, но вместо редиректа на логин отвечает 401."""
+    @wraps(view)
+    def check_user(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        return error('Требуется авторизация.', status=401)
+    return check_user
+
+
+def error(detail, status=400):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def request_data(request):
+    """Данные запроса из JSON-тела или из формы."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'image': (
+            post_image_storage.url(row['image']) if row['image'] else None
+        ),
+        'comments_count': row['comments_count'],
+        'author': {
+            'username': row['author__username'],
+            'full_name': ' '.join(filter(None, (
+                row['author__first_name'], row['author__last_name']
+            ))),
+        },
+        'group': row['group__slug'] and {
+            'slug': row['group__slug'],
+            'title': row['group__title'],
+        },
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'post': row['post_id'],
+        'text': row['text'],
+        'created': row['created'],
+        'author': row['author__username'],
+    }
+
+
+def cursor_response(request, queryset, serialize, per_page, field):
+    page = CursorPaginator(queryset, per_page, field=field).cursor_page(
+        request.GET.get('cursor')
+    )
+    return page_response(page, serialize)
+
+
+def page_response(page, serialize):
+    return JsonResponse({
+        'results': [serialize(row) for row in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+def feed_response(request, posts):
+    return cursor_response(
+        request, posts.values(*POST_FIELDS), serialize_post, TEN, 'pub_date'
+    )
+
+
+@require_GET
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@require_GET
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed_response(request, Post.objects.filter(group=group))
+
+
+@require_GET
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_response(request, Post.objects.filter(author=author))
+
+
+@require_GET
+@api_login_required
+def follow_posts(request):
+    page = follow_page(
+        request.user,
+        request.GET.get('cursor'),
+        posts=Post.objects.values(*POST_FIELDS),
+    )
+    return page_response(page, serialize_post)
+
+
+@require_GET
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if row is None:
+        return error('Пост не найден.', status=404)
+    return JsonResponse(serialize_post(row))
+
+
+@require_http_methods(['GET', 'POST'])
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Пост не найден.', status=404)
+    if request.method == 'GET':
+        return cursor_response(
+            request,
+            Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+            serialize_comment,
+            COMMENTS_PER_PAGE,
+            'created',
+        )
+    return add_comment(request, post_id)
+
+
+@api_login_required
+def add_comment(request, post_id):
+    data = request_data(request)
+    if data is None:
+        return error('Тело запроса должно быть JSON-объектом.')
+    form = CommentForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post_id = post_id
+    comment.save()
+    return JsonResponse(serialize_comment({
+        'id': comment.pk,
+        'post_id': post_id,
+        'text': comment.text,
+        'created': comment.created,
+        'author__username': request.user.username,
+    }), status=201)
+
+
+@require_http_methods(['POST', 'DELETE'])
+@api_login_required
+def follow(request, username):
+    """POST подписывает на автора, DELETE отписывает."""
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    if author == request.user:
+        return error('Нельзя подписаться на самого себя.')
+    if request.method == 'DELETE':
+        Follow.objects.filter(user=request.user, author=author).delete()
+        return JsonResponse({'following': False})
+    _, created = Follow.objects.get_or_create(
+        user=request.user, author=author
+    )
+    return JsonResponse({'following': True}, status=201 if created else 200)
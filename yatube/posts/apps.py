@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Подключаем обработчики сигналов, сбрасывающие кэш лент.
+        from . import signals  # noqa: F401
@@ -0,0 +1,418 @@
+"""Нагрузочный стенд для страниц постов.
+
+generate() наполняет базу данными в масштабе живого сайта через
+bulk_create: авторов выбирают со смещением к популярным, поэтому граф
+подписок плотный вокруг нескольких знаменитостей, а у горячих постов
+тысячи комментариев. Replay прогоняет через тестовый клиент смесь
+запросов и считает перцентили времени ответа, число запросов к базе
+и пропускную способность. Результат - словарь, который команды
+выводят как JSON для сравнения прогонов.
+"""
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, router, transaction
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metrics import Measurement, percentile
+from core.middleware import page_cache
+
+from .counters import rebuild_counters
+from .feeds import feed_cache
+from .importer import insert_dated
+from .models import (AuthorStats, Comment, Follow, Group, Post,
+                     TimelineEntry, User)
+from .paginators import NEXT, encode_cursor
+from .search import available, rebuild_search_index
+from .timeline import backfill_timeline
+
+USER_PREFIX = 'bench_user_'
+READER_PREFIX = 'bench_reader_'
+GROUP_PREFIX = 'bench-group-'
+BATCH_SIZE = 5000
+# Доли запросов в смеси по умолчанию
+MIX = {
+    'index': 30,
+    'group_list': 15,
+    'profile': 15,
+    'post_detail': 20,
+    'follow_index': 15,
+    'add_comment': 5,
+}
+# Страницы, которые открывают и анонимы
+PUBLIC_ENDPOINTS = ('index', 'group_list', 'profile', 'post_detail')
+# Ленты, которые листают дальше первой страницы
+FEED_ENDPOINTS = ('index', 'group_list', 'profile', 'follow_index')
+PERCENTILES = (50, 95, 99)
+
+
+def skewed(rng, size, power=3):
+    """Индекс от 0 до size - 1; маленькие индексы выпадают чаще."""
+    return int(size * rng.random() ** power)
+
+
+def in_batches(objects, batch_size):
+    batch = []
+    for item in objects:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(users=100_000, posts=1_000_000, groups=50, follows=50,
+             readers=1000, hot_posts=10, hot_comments=10_000, days=365,
+             batch_size=BATCH_SIZE, search=False, seed=0, log=None):
+    """Создаёт данные стенда и возвращает число созданных строк.
+
+    Ленты подписок собираются только для читателей (bench_reader_*),
+    от имени которых Replay открывает ленту и пишет комментарии;
+    у остальных подписчиков лент было бы на десятки миллионов строк.
+    """
+    log = log or (lambda message: None)
+    if User.objects.filter(username__startswith=USER_PREFIX).exists():
+        raise ValueError('Данные стенда уже есть, сначала удалите их.')
+    rng = random.Random(seed)
+    hot_posts = min(hot_posts, posts)
+    password = make_password(None)
+    log('Пользователи')
+    names = [f'{USER_PREFIX}{number}' for number in range(users)]
+    names += [f'{READER_PREFIX}{number}' for number in range(readers)]
+    for batch in in_batches(names, batch_size):
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in batch]
+        )
+    # SQLite не возвращает id из bulk_create.
+    ids = dict(User.objects.filter(
+        username__startswith='bench_'
+    ).values_list('username', 'pk'))
+    author_ids = [ids[f'{USER_PREFIX}{number}'] for number in range(users)]
+    reader_ids = [
+        ids[f'{READER_PREFIX}{number}'] for number in range(readers)
+    ]
+    Group.objects.bulk_create([
+        Group(
+            slug=f'{GROUP_PREFIX}{number}',
+            title=f'Группа {number}',
+            description='Группа стенда',
+        )
+        for number in range(groups)
+    ])
+    group_ids = list(Group.objects.filter(
+        slug__startswith=GROUP_PREFIX
+    ).values_list('pk', flat=True))
+    log('Посты')
+    first_id = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    now = timezone.now()
+    span = timedelta(days=days)
+    for batch in in_batches(range(posts), batch_size):
+        with transaction.atomic():
+            insert_dated(Post, [
+                Post(
+                    pk=first_id + number,
+                    author_id=author_ids[skewed(rng, users)],
+                    group_id=(
+                        rng.choice(group_ids) if rng.random() < 0.5
+                        else None
+                    ),
+                    text=f'Пост стенда номер {number}',
+                    # Чем больше id, тем новее пост, как на сайте.
+                    pub_date=now - span * (1 - number / posts),
+                )
+                for number in batch
+            ], 'pub_date')
+    log('Комментарии')
+    hot_ids = range(first_id + posts - hot_posts, first_id + posts)
+    first_comment_id = (
+        Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+    ) + 1
+    comments = (
+        Comment(
+            pk=first_comment_id + index * hot_comments + number,
+            post_id=post_id,
+            author_id=author_ids[skewed(rng, users, power=1)],
+            text=f'Комментарий стенда {number}',
+            created=now - timedelta(seconds=hot_comments - number),
+        )
+        for index, post_id in enumerate(hot_ids)
+        for number in range(hot_comments)
+    )
+    for batch in in_batches(comments, batch_size):
+        with transaction.atomic():
+            insert_dated(Comment, batch, 'created')
+    log('Подписки')
+    pairs = (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in author_ids + reader_ids
+        for author_id in {
+            author_ids[skewed(rng, users)] for _ in range(follows)
+        }
+        if author_id != user_id
+    )
+    for batch in in_batches(pairs, batch_size):
+        with transaction.atomic():
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+    log('Счётчики и ленты')
+    rebuild_counters()
+    for user_id in reader_ids:
+        with transaction.atomic():
+            for author_id in Follow.objects.filter(
+                user_id=user_id
+            ).values_list('author_id', flat=True):
+                backfill_timeline(user_id, author_id)
+    if search:
+        log('Поисковый индекс')
+        rebuild_search_index()
+    feed_cache().clear()
+    page_cache().clear()
+    return {
+        'users': users + readers,
+        'groups': groups,
+        'posts': posts,
+        'comments': hot_posts * hot_comments,
+        'follows': Follow.objects.filter(
+            user__username__startswith='bench_'
+        ).count(),
+    }
+
+
+def raw_delete(queryset):
+    """Один DELETE без каскада ORM и без сигналов на каждую строку.
+
+    Запрос пишется руками через cursor: delete() сначала читает строки
+    для каскада и сигналов, а это ровно то, чего здесь нужно избежать.
+    Ссылки на удаляемые строки вызывающий чистит сам, раньше них.
+    """
+    model = queryset.model
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connections[router.db_for_write(model)].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE {model._meta.pk.column} IN ({sql})',
+            params
+        )
+
+
+def delete_generated():
+    """Удаляет данные стенда вместе с постами и подписками.
+
+    Каскад delete() загрузил бы миллионы строк и на каждую послал бы
+    сигналы, которые по одной правят счётчики, ленты и индекс. Таблицы
+    чистятся запросами DELETE в порядке ссылок, а производные данные
+    пересчитываются один раз в конце.
+    """
+    users = User.objects.filter(username__startswith='bench_')
+    groups = Group.objects.filter(slug__startswith=GROUP_PREFIX)
+    posts = Post.objects.filter(author__in=users)
+    with transaction.atomic():
+        raw_delete(TimelineEntry.objects.filter(post__in=posts))
+        raw_delete(TimelineEntry.objects.filter(user__in=users))
+        raw_delete(Comment.objects.filter(post__in=posts))
+        raw_delete(Comment.objects.filter(author__in=users))
+        raw_delete(Follow.objects.filter(author__in=users))
+        raw_delete(Follow.objects.filter(user__in=users))
+        raw_delete(posts)
+        # Посты остальных авторов остаются, но без группы стенда.
+        Post.objects.filter(group__in=groups).update(group=None)
+        raw_delete(groups)
+        raw_delete(AuthorStats.objects.filter(user__in=users))
+        raw_delete(User.groups.through.objects.filter(user__in=users))
+        raw_delete(
+            User.user_permissions.through.objects.filter(user__in=users)
+        )
+        raw_delete(users)
+        rebuild_counters()
+    if available():
+        rebuild_search_index()
+    feed_cache().clear()
+    page_cache().clear()
+
+
+def parse_mix(text):
+    """Смесь из строки вида index=30,profile=10."""
+    mix = {}
+    for item in filter(None, text.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in MIX:
+            raise ValueError(f'Неизвестная страница: {name}')
+        mix[name] = int(weight)
+    return mix
+
+
+class Replay:
+    """Выбирает запросы смеси и замеряет их тестовым клиентом."""
+
+    def __init__(self, mix=None, clients=20, anonymous=0.5, hot_share=0.2,
+                 seed=0):
+        self.rng = random.Random(seed)
+        self.mix = mix or MIX
+        self.anonymous = anonymous
+        self.hot_share = hot_share
+        readers = list(User.objects.filter(
+            username__startswith=READER_PREFIX
+        ).order_by('pk')[:clients])
+        if not readers:
+            raise ValueError('Нет данных стенда: запустите генерацию.')
+        self.clients = []
+        for reader in readers:
+            client = Client()
+            client.force_login(reader)
+            self.clients.append(client)
+        self.anonymous_client = Client()
+        self.group_slugs = list(Group.objects.filter(
+            slug__startswith=GROUP_PREFIX
+        ).values_list('slug', flat=True))
+        authors = User.objects.filter(
+            username__startswith=USER_PREFIX
+        ).values_list('username', flat=True)
+        # Популярные авторы - с маленькими номерами, см. generate().
+        self.authors = sorted(
+            authors, key=lambda name: int(name.rsplit('_', 1)[-1])
+        )
+        self.last_post = (
+            Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        )
+        self.hot_posts = list(Post.objects.filter(
+            comments_count__gt=0
+        ).order_by('-comments_count').values_list('pk', flat=True)[:10])
+
+    def post_id(self):
+        if self.hot_posts and self.rng.random() < self.hot_share:
+            return self.rng.choice(self.hot_posts)
+        # Свежие посты открывают чаще старых.
+        return max(self.last_post - skewed(self.rng, self.last_post), 1)
+
+    def cursor(self):
+        """Курсор следующей страницы ленты за одним из свежих постов."""
+        post = Post.objects.filter(pk__lte=self.post_id()).order_by(
+            '-pk'
+        ).values('id', 'pub_date').first()
+        return encode_cursor(NEXT, post) if post else None
+
+    def next_request(self):
+        """(страница, клиент, метод, адрес, данные)"""
+        endpoint = self.rng.choices(
+            list(self.mix), weights=list(self.mix.values())
+        )[0]
+        client = self.rng.choice(self.clients)
+        if (
+            endpoint in PUBLIC_ENDPOINTS
+            and self.rng.random() < self.anonymous
+        ):
+            client = self.anonymous_client
+        if endpoint == 'index':
+            url = reverse('posts:index')
+        elif endpoint == 'group_list':
+            url = reverse(
+                'posts:group_list', args=[self.rng.choice(self.group_slugs)]
+            )
+        elif endpoint == 'profile':
+            url = reverse('posts:profile', args=[
+                self.authors[skewed(self.rng, len(self.authors))]
+            ])
+        elif endpoint == 'post_detail':
+            url = reverse('posts:post_detail', args=[self.post_id()])
+        elif endpoint == 'follow_index':
+            url = reverse('posts:follow_index')
+        else:
+            url = reverse('posts:add_comment', args=[self.post_id()])
+            return endpoint, client, 'post', url, {'text': 'Комментарий'}
+        if endpoint in FEED_ENDPOINTS and self.rng.random() < 0.2:
+            # Дальше листают по ссылке с курсором, а не ?page=N: номер
+            # страницы обслуживает старый пагинатор с OFFSET и COUNT.
+            cursor = self.cursor()
+            if cursor:
+                return endpoint, client, 'get', url, {'cursor': cursor}
+        return endpoint, client, 'get', url, {}
+
+    def run(self, requests, warmup=0):
+        for _ in range(warmup):
+            _, client, method, url, data = self.next_request()
+            getattr(client, method)(url, data)
+        samples = defaultdict(list)
+        statuses = defaultdict(Counter)
+        page_cache = Counter()
+        started = time.perf_counter()
+        for _ in range(requests):
+            endpoint, client, method, url, data = self.next_request()
+            measurement = Measurement()
+            request_started = time.perf_counter()
+            with connection.execute_wrapper(measurement):
+                response = getattr(client, method)(url, data)
+            samples[endpoint].append((
+                time.perf_counter() - request_started, measurement.queries
+            ))
+            statuses[endpoint][response.status_code] += 1
+            if response.has_header('X-Cache'):
+                page_cache[response['X-Cache']] += 1
+        seconds = time.perf_counter() - started
+        return report(samples, statuses, page_cache, seconds)
+
+
+def summary(samples):
+    timings = [seconds for seconds, _ in samples]
+    queries = [count for _, count in samples]
+    result = {'requests': len(samples)}
+    for share in PERCENTILES:
+        result[f'p{share}_ms'] = round(percentile(timings, share) * 1000, 3)
+    result['mean_ms'] = round(sum(timings) / len(timings) * 1000, 3)
+    result['queries_mean'] = round(sum(queries) / len(queries), 2)
+    result['queries_max'] = max(queries)
+    return result
+
+
+def report(samples, statuses, page_cache, seconds):
+    every = [sample for items in samples.values() for sample in items]
+    endpoints = {}
+    for endpoint, items in sorted(samples.items()):
+        endpoints[endpoint] = summary(items)
+        endpoints[endpoint]['statuses'] = {
+            str(status): count
+            for status, count in sorted(statuses[endpoint].items())
+        }
+        endpoints[endpoint]['errors'] = sum(
+            count for status, count in statuses[endpoint].items()
+            if status >= 400
+        )
+    return {
+        'requests': len(every),
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(len(every) / seconds, 1),
+        'overall': summary(every),
+        'endpoints': endpoints,
+        'page_cache': dict(page_cache),
+        'database': connection.vendor,
+        'debug': settings.DEBUG,
+    }
+
+
+def compare(current, baseline):
+    """Отношение метрик прогона к прошлому: меньше 1 - стало быстрее."""
+
+    def ratios(now, before):
+        return {
+            key: round(now[key] / before[key], 3) if before[key] else None
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_mean')
+        }
+
+    result = {
+        'throughput': round(
+            current['throughput_rps'] / baseline['throughput_rps'], 3
+        ),
+        'overall': ratios(current['overall'], baseline['overall']),
+    }
+    result['endpoints'] = {
+        endpoint: ratios(values, baseline['endpoints'][endpoint])
+        for endpoint, values in current['endpoints'].items()
+        if endpoint in baseline['endpoints']
+    }
+    return result
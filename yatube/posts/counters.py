@@ -0,0 +1,66 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно меняет счётчик на delta, не уводя его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_author_stats(user_id, field, delta):
+    from .models import AuthorStats
+
+    if delta > 0:
+        AuthorStats.objects.get_or_create(user_id=user_id)
+    change_counter(
+        AuthorStats.objects.filter(user_id=user_id), field, delta
+    )
+
+
+def count_of(model, field):
+    """Подзапрос: сколько строк model ссылаются полем field на объект."""
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def rebuild_counters(apps=global_apps):
+    """Пересчитывает все денормализованные счётчики с нуля."""
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    with transaction.atomic():
+        Group.objects.update(posts_count=count_of(Post, 'group'))
+        Post.objects.update(comments_count=count_of(Comment, 'post'))
+        AuthorStats.objects.all().delete()
+        users = User.objects.annotate(
+            posts_total=count_of(Post, 'author'),
+            followers_total=count_of(Follow, 'author'),
+            following_total=count_of(Follow, 'user'),
+        ).values_list(
+            'pk', 'posts_total', 'followers_total', 'following_total'
+        )
+        AuthorStats.objects.bulk_create(
+            (
+                AuthorStats(
+                    user_id=pk,
+                    posts_count=posts,
+                    followers_count=followers,
+                    following_count=following,
+                )
+                for pk, posts, followers, following
+                in users.iterator(chunk_size=BATCH_SIZE)
+                if posts or followers or following
+            ),
+        )
@@ -0,0 +1,32 @@
+"""Посты, которые поток сейчас удаляет вместе с комментариями.
+
+Пока пост в этом множестве, обработчики сигналов его комментариев
+ничего не делают: счётчик комментариев исчезает вместе с постом, а
+ленты, страницы и индекс сбрасывают обработчики самого поста.
+"""
+import threading
+from contextlib import contextmanager
+
+_deleting = threading.local()
+
+
+def deleting_posts():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+@contextmanager
+def deleting(post_ids):
+    """Помечает посты на время каскада.
+
+    Метки снимаются в finally: если удаление упадёт и откатится, пост
+    останется в базе, и его комментарии снова должны обрабатываться.
+    """
+    posts = deleting_posts()
+    added = set(post_ids) - posts
+    posts.update(added)
+    try:
+        yield
+    finally:
+        posts.difference_update(added)
@@ -0,0 +1,144 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import NoReverseMatch, reverse
+
+from core.db import pin_request, replicas
+
+# Ключ версии ленты: feed_version:<лента>[:<id>]
+FEED_VERSION_KEY = 'feed_version:{}'
+# Отметка, что версия ленты сменилась недавно и реплики могут отставать
+FEED_BUMPED_KEY = 'feed_bumped:{}'
+INDEX_FEED = 'index'
+GROUP_FEED = 'group'
+PROFILE_FEED = 'profile'
+FOLLOW_FEED = 'follow'
+# Страница поста: сам пост и его комментарии
+POST_PAGE = 'post'
+
+
+def feed_cache():
+    """Кэш, в котором лежат версии лент и фрагменты их страниц."""
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def feed_key(feed, pk=None):
+    """Возвращает ключ версии ленты в кэше."""
+    if pk is None:
+        return FEED_VERSION_KEY.format(feed)
+    return FEED_VERSION_KEY.format(f'{feed}:{pk}')
+
+
+def get_feed_version(feed, pk=None):
+    """Текущая версия ленты.
+
+    Начальное значение берётся от времени, чтобы после вытеснения ключа
+    из кэша версия не совпала с версией уже закэшированных фрагментов.
+    """
+    return feed_cache().get_or_set(feed_key(feed, pk), time.time_ns())
+
+
+def bump_feed_versions(keys):
+    """Увеличивает версии лент, делая их закэшированные страницы устаревшими.
+    """
+    cache = feed_cache()
+    keys = set(keys)
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Ключа ещё нет - ленту никто не кэшировал.
+            cache.set(key, time.time_ns())
+    if replicas():
+        # Отметки живут, пока реплика может не знать о записи.
+        cache.set_many(
+            {FEED_BUMPED_KEY.format(key): True for key in keys},
+            timeout=settings.REPLICA_STICKY_SECONDS,
+        )
+
+
+def post_feed_keys(author_id, group_id):
+    """Ключи всех лент, в которых показывается пост автора из группы."""
+    # Импорт здесь, чтобы избежать циклического импорта с models.
+    from .models import Follow
+
+    keys = [feed_key(INDEX_FEED), feed_key(PROFILE_FEED, author_id)]
+    if group_id is not None:
+        keys.append(feed_key(GROUP_FEED, group_id))
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    keys.extend(feed_key(FOLLOW_FEED, user_id) for user_id in followers)
+    return keys
+
+
+def page_etag(request, *feeds):
+    """ETag страницы по версиям лент, из которых она собрана.
+
+    feeds - пары (лента, id). В хэш входят адрес с параметрами и
+    пользователь: одни и те же посты разные посетители видят
+    с разной шапкой и кнопками. Версии остаются в
+    request.feed_versions для кэша страниц.
+
+    Если версия сменилась недавно, страница читается с основной базы:
+    иначе данные отстающей реплики попали бы в кэш под новой версией
+    и жили бы там до следующей записи.
+    """
+    keys = [feed_key(feed, pk) for feed, pk in feeds]
+    if replicas() and feed_cache().get_many(
+        [FEED_BUMPED_KEY.format(key) for key in keys]
+    ):
+        pin_request()
+    versions = [get_feed_version(feed, pk) for feed, pk in feeds]
+    # По этим версиям кэш страниц проверяет, не устарел ли ответ.
+    request.feed_versions = dict(zip(keys, versions))
+    raw = f'{request.get_full_path()}|{request.user.pk}|{versions}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_path(viewname, *args):
+    """Адрес страницы или None, если из таких аргументов его не собрать.
+
+    Например, для группы со слагом, который не подходит под шаблон URL.
+    """
+    try:
+        return reverse(viewname, args=args)
+    except NoReverseMatch:
+        return None
+
+
+def profile_paths(*user_ids):
+    """Адреса профилей пользователей."""
+    from django.contrib.auth import get_user_model
+
+    usernames = get_user_model().objects.filter(
+        pk__in=user_ids
+    ).values_list('username', flat=True)
+    return [page_path('posts:profile', name) for name in usernames]
+
+
+def group_paths(*group_ids):
+    from .models import Group
+
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    return [page_path('posts:group_list', slug) for slug in slugs]
+
+
+def post_page_paths(post_id, author_id, group_id):
+    """Адреса страниц, на которых показывается пост.
+
+    Нужны кэшу целых страниц: ленты подписок в нём нет, она
+    доступна только вошедшим пользователям.
+    """
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:post_detail', args=[post_id]),
+    ]
+    paths.extend(profile_paths(author_id))
+    if group_id is not None:
+        paths.extend(group_paths(group_id))
+    return paths
@@ -0,0 +1,62 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# Картинки больше этого размера уменьшаются при загрузке
+MAX_SIZE = (1920, 1920)
+# Основной формат хранения; картинки с прозрачностью уходят в WebP или PNG
+FORMAT = 'JPEG'
+QUALITY = 85
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png', 'GIF': 'gif'}
+
+
+def target_format(image):
+    image_format = getattr(settings, 'POST_IMAGE_FORMAT', FORMAT)
+    if image_format == 'WEBP' and not features.check('webp'):
+        image_format = 'JPEG'
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if image_format == 'JPEG' and has_alpha:
+        return 'WEBP' if features.check('webp') else 'PNG'
+    return image_format
+
+
+def normalize_image(upload):
+    """Готовит загруженную картинку к хранению.
+
+    Поворачивает по EXIF, уменьшает до MAX_SIZE, перекодирует без
+    метаданных и называет файл по хэшу содержимого. Анимированные
+    картинки сохраняются как есть, меняется только имя.
+    """
+    upload.seek(0)
+    data = upload.read()
+    image = Image.open(BytesIO(data))
+    if getattr(image, 'is_animated', False):
+        extension = EXTENSIONS.get(image.format, 'gif')
+    else:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(
+            getattr(settings, 'POST_IMAGE_MAX_SIZE', MAX_SIZE),
+            Image.LANCZOS
+        )
+        image_format = target_format(image)
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        buffer = BytesIO()
+        image.save(
+            buffer,
+            image_format,
+            quality=QUALITY,
+            optimize=True,
+            progressive=image_format == 'JPEG',
+        )
+        data = buffer.getvalue()
+        extension = EXTENSIONS[image_format]
+    digest = hashlib.sha256(data).hexdigest()
+    return ContentFile(data, name=f'{digest}.{extension}')
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import MIX, Replay, compare, parse_mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет смесь запросов к страницам постов через тестовый '
+        'клиент и выводит JSON с p50/p95/p99, запросами к базе и '
+        'пропускной способностью. Данные - generate_benchmark_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--warmup', type=int, default=100)
+        parser.add_argument(
+            '--mix', default=','.join(f'{k}={v}' for k, v in MIX.items()),
+            help='Веса страниц, например index=30,post_detail=20.'
+        )
+        parser.add_argument(
+            '--clients', type=int, default=20,
+            help='Сколько читателей стенда открывают страницы.'
+        )
+        parser.add_argument(
+            '--anonymous', type=float, default=0.5,
+            help='Доля анонимных запросов к открытым страницам.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', '-o', help='Файл для JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            replay = Replay(
+                mix=parse_mix(options['mix']),
+                clients=options['clients'],
+                anonymous=options['anonymous'],
+                seed=options['seed'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        result = replay.run(options['requests'], warmup=options['warmup'])
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline:
+                result['compared'] = compare(result, json.load(baseline))
+        text = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text + '\n')
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import CHUNK_SIZE, FORMATS, NDJSON, TABLES, export_stream
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии и подписки в NDJSON или CSV. '
+        'Строки читаются порциями, память не зависит от размера таблиц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            # Без choices: argparse сверял бы с ними и пустой список.
+            # Имена таблиц проверяет export_stream().
+            'tables', nargs='*',
+            help=f'Таблицы для выгрузки: {", ".join(TABLES)}; '
+                 'по умолчанию все.'
+        )
+        parser.add_argument('--format', choices=FORMATS, default=NDJSON)
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip.'
+        )
+        parser.add_argument(
+            '--output', '-o', help='Файл для выгрузки, по умолчанию stdout.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            chunks = export_stream(
+                options['tables'] or list(TABLES),
+                options['format'],
+                compress=options['gzip'],
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        binary = options['gzip']
+        if options['output']:
+            mode = 'wb' if binary else 'w'
+            encoding = None if binary else 'utf-8'
+            with open(options['output'], mode, encoding=encoding) as output:
+                output.writelines(chunks)
+        elif binary:
+            sys.stdout.buffer.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import BATCH_SIZE, delete_generated, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу данными для нагрузочного стенда: пользователи, '
+        'посты, плотный граф подписок и горячие посты с комментариями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--follows', type=int, default=50,
+            help='Подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--readers', type=int, default=1000,
+            help='Пользователей с лентой подписок для прогона.'
+        )
+        parser.add_argument('--hot-posts', type=int, default=10)
+        parser.add_argument(
+            '--hot-comments', type=int, default=10_000,
+            help='Комментариев у каждого горячего поста.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--search', action='store_true',
+            help='Пересобрать поисковый индекс.'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Сначала удалить прошлые данные стенда.'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            delete_generated()
+        try:
+            counts = generate(
+                users=options['users'],
+                posts=options['posts'],
+                groups=options['groups'],
+                follows=options['follows'],
+                readers=options['readers'],
+                hot_posts=options['hot_posts'],
+                hot_comments=options['hot_comments'],
+                batch_size=options['batch_size'],
+                search=options['search'],
+                seed=options['seed'],
+                log=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        summary = ', '.join(
+            f'{table}: {count}' for table, count in counts.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Создано - {summary}.'))
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import render
+
+
+def render_in_thread(name):
+    try:
+        render(name)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие миниатюры картинок постов: догоняет очередь '
+        'фонового воркера, например после перезапуска сервера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).values_list('image', flat=True).distinct()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            total = sum(
+                1 for _ in pool.map(render_in_thread, names.iterator())
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено картинок: {total}.'
+        ))
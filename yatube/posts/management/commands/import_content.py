@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from posts.importer import (BATCH_SIZE, IMAGE_WORKERS, TABLES, Importer,
+                            read_records)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из NDJSON или CSV пачками bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы .ndjson или .csv')
+        parser.add_argument(
+            '--table', choices=TABLES,
+            help='Таблица для CSV и для NDJSON без поля type.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--image-workers', type=int, default=IMAGE_WORKERS
+        )
+        parser.add_argument(
+            '--image-root', default='',
+            help='Каталог, от которого считаются пути картинок.'
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options['batch_size'],
+            image_workers=options['image_workers'],
+            image_root=options['image_root'],
+        )
+
+        def records():
+            for path in options['paths']:
+                yield from read_records(path, options['table'])
+
+        try:
+            counts = importer.run(records())
+        except (OSError, ValueError, KeyError, DatabaseError) as error:
+            # Загрузка шла в одной транзакции и откатилась целиком.
+            raise CommandError(f'Загрузка отменена: {error}')
+        summary = ', '.join(
+            f'{table}: {count}' for table, count in counts.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Загружено - {summary}.'))
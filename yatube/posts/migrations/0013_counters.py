@@ -0,0 +1,77 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+# Копия posts.counters на момент миграции: код приложения может
+# измениться, а миграция должна работать с моделями этого состояния.
+def count_of(model, field):
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Group.objects.update(posts_count=count_of(Post, 'group'))
+    Post.objects.update(comments_count=count_of(Comment, 'post'))
+    users = User.objects.annotate(
+        posts_total=count_of(Post, 'author'),
+        followers_total=count_of(Follow, 'author'),
+        following_total=count_of(Follow, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    AuthorStats.objects.bulk_create(
+        AuthorStats(
+            user_id=pk,
+            posts_count=posts,
+            followers_count=followers,
+            following_count=following,
+        )
+        for pk, posts, followers, following in users.iterator()
+        if posts or followers or following
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_auto_20220605_1806'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
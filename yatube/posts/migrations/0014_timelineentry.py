@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+import django.db.models.deletion
+
+TIMELINE_SIZE = 500
+
+
+# Копия posts.timeline.rebuild_timelines на момент миграции.
+def fill_timelines(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    ranked = Post.objects.annotate(
+        entry_user=F('author__following__user_id'),
+        position=Window(
+            RowNumber(),
+            partition_by=[F('author__following__user_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        ),
+    ).order_by().values('entry_user', 'id', 'pub_date', 'position')
+    sql, params = ranked.query.sql_with_params()
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT entry_user, id, pub_date FROM ({sql}) ranked '
+            f'WHERE entry_user IS NOT NULL AND position <= %s',
+            (*params, getattr(settings, 'TIMELINE_SIZE', TIMELINE_SIZE)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:17
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
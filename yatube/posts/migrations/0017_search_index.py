@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# Копия posts.search на момент миграции: код приложения может
+# измениться, а миграция должна строить индекс этого состояния.
+POST_INDEX = 'posts_post_search'
+COMMENT_INDEX = 'posts_comment_search'
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+
+def build_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if ('ENABLE_FTS5',) not in cursor.fetchall():
+            return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {POST_INDEX} '
+            f"USING fts5(text, tokenize='{TOKENIZER}')"
+        )
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENT_INDEX} '
+            f"USING fts5(text, post_id UNINDEXED, tokenize='{TOKENIZER}')"
+        )
+        cursor.executemany(
+            f'INSERT INTO {POST_INDEX} (rowid, text) VALUES (%s, %s)',
+            Post.objects.using(connection.alias).values_list('pk', 'text')
+            .iterator()
+        )
+        cursor.executemany(
+            f'INSERT INTO {COMMENT_INDEX} (rowid, text, post_id) '
+            'VALUES (%s, %s, %s)',
+            Comment.objects.using(connection.alias).values_list(
+                'pk', 'text', 'post_id'
+            ).iterator()
+        )
+    # Соединение запоминает, есть ли индекс; пусть спросит заново.
+    connection.search_index = None
+
+
+def remove_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {POST_INDEX}')
+        cursor.execute(f'DROP TABLE IF EXISTS {COMMENT_INDEX}')
+    connection.search_index = None
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_index, remove_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:04
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Копия posts.storage.rebuild_image_references на момент миграции.
+def fill_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ImageReference = apps.get_model('posts', 'ImageReference')
+    ImageReference.objects.bulk_create(
+        ImageReference(name=row['image'], count=row['total'])
+        for row in Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).order_by().values('image').annotate(total=Count('pk'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_timeline_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageReference',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Ссылки на картинку',
+                'verbose_name_plural': 'Ссылки на картинки',
+            },
+        ),
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_imagereference'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_post_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created', '-id'], name='comment_post_created_id_idx'),
+        ),
+    ]
@@ -1,13 +1,46 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .deletion import deleting
+from .images import normalize_image
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def delete(self):
+        with deleting(self.values_list('pk', flat=True)):
+            return super().delete()
+
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом с постом.
+
+        Ненужные шаблонам колонки не загружаются, количество
+        комментариев хранится в самом посте (comments_count).
+        """
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'group__description',
+        )
+
+
+class CommentQuerySet(models.QuerySet):
+    def listing(self):
+        """Комментарии для страницы поста вместе с авторами."""
+        return self.select_related('author').defer('author__password')
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    # Счётчик постов группы, поддерживается сигналами posts.signals
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -40,20 +73,58 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         null=True,
         blank=True
     )
     # Аргумент upload_to указывает директорию,
     # в которую будут загружаться пользовательские файлы.
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы под фильтр и сортировку лент; id в конце - для
+        # курсорной пагинации по (pub_date, id).
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Новую загрузку уменьшаем и перекодируем до записи на диск.
+        # Каждая загрузка берёт ссылку на файл, это видят сигналы.
+        self._image_uploaded = bool(self.image and not self.image._committed)
+        if self._image_uploaded:
+            self.image = normalize_image(self.image)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Комментарии удаляются каскадом; их обработчики сигналов
+        # пропускают пост, пока он помечен (posts.deletion).
+        with deleting([self.pk]):
+            return super().delete(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -76,8 +147,17 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
+        # id в конце - для курсорной пагинации по (created, id).
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_id_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -105,3 +185,84 @@ class Follow(models.Model):
                 check=~models.Q(author=models.F('user'))
             )
         ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, чтобы не считать их агрегатами на лету."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count}'
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя; без записи в таблице все они нулевые."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+
+class ImageReference(models.Model):
+    """Число ссылок на файл картинки в хранилище по содержимому.
+
+    Загрузка увеличивает счётчик до записи файла, удаление поста
+    уменьшает. Файл удаляется под блокировкой этой строки, поэтому
+    одновременная загрузка тех же байтов не теряет свой файл.
+    """
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    count = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Ссылки на картинку'
+        verbose_name_plural = 'Ссылки на картинки'
+
+    def __str__(self):
+        return f'{self.name}: {self.count}'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    # Копия даты поста, чтобы сортировать ленту без join с постами
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        # post в конце - для курсора по (pub_date, post) без сортировки.
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_post_idx',
+            ),
+        ]
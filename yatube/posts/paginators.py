@@ -0,0 +1,122 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.utils.dateparse import parse_datetime
+
+TEN = 10
+COMMENTS_PER_PAGE = 20
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, post, field='pub_date'):
+    """Упаковывает позицию (дата, id) в непрозрачный токен.
+
+    post - объект модели или словарь из values() с ключом id.
+    """
+    if isinstance(post, dict):
+        value, pk = post[field], post['id']
+    else:
+        value, pk = getattr(post, field), post.pk
+    raw = f'{direction}|{value.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or value is None:
+        return None
+    return direction, value, pk
+
+
+def keyset(queryset, cursor, field='pub_date', pk='pk'):
+    """Записи queryset за позицией курсора в порядке чтения страницы.
+
+    Условие - диапазон по field и отсев записей с той же датой, а не OR
+    двух сравнений: с ним база ищет по индексу (..., field, id) сразу
+    с позиции курсора, а не листает индекс с начала.
+    """
+    if cursor is None:
+        return queryset.order_by(f'-{field}', f'-{pk}')
+    direction, value, pk_value = cursor
+    if direction == NEXT:
+        return queryset.filter(**{f'{field}__lte': value}).exclude(
+            **{field: value, f'{pk}__gte': pk_value}
+        ).order_by(f'-{field}', f'-{pk}')
+    return queryset.filter(**{f'{field}__gte': value}).exclude(
+        **{field: value, f'{pk}__lte': pk_value}
+    ).order_by(field, pk)
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор по (pub_date, id).
+
+    Не делает ни COUNT(*), ни OFFSET: страница выбирается условием
+    по ключу последнего показанного поста, поэтому глубокие страницы
+    стоят столько же, сколько первая. Поле даты задаётся field,
+    например created для комментариев.
+    """
+    keyset = True
+
+    def __init__(self, object_list, per_page, field='pub_date', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.field = field
+
+    def cursor_page(self, token=None):
+        cursor = decode_cursor(token) if token else None
+        rows = keyset(self.object_list, cursor, self.field)
+        return self.page_from(list(rows[:self.per_page + 1]), cursor, token)
+
+    def page_from(self, posts, cursor, token=None):
+        """Страница из записей за курсором в порядке чтения.
+
+        Записей выбирается на одну больше per_page: по лишней видно,
+        есть ли соседняя страница.
+        """
+        direction = cursor[0] if cursor is not None else NEXT
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if direction == PREVIOUS:
+            posts.reverse()
+        # Соседняя страница существует, если нам выдали лишнюю запись
+        # или если мы пришли с неё по курсору.
+        has_next = has_more if direction == NEXT else cursor is not None
+        has_previous = (
+            cursor is not None if direction == NEXT else has_more
+        )
+        field = self.field
+        page = Page(posts, 1, self)
+        page.cursor = token or ''
+        page.next_cursor = (
+            encode_cursor(NEXT, posts[-1], field) if has_next and posts else ''
+        )
+        page.previous_cursor = (
+            encode_cursor(PREVIOUS, posts[0], field)
+            if has_previous and posts else ''
+        )
+        return page
+
+
+def paginate(request, queryset, per_page=TEN):
+    """Страница ленты для запроса.
+
+    По умолчанию и с параметром ?cursor= используется keyset-пагинация.
+    Старые ссылки вида ?page=N обслуживаются обычным Paginator.
+    """
+    page_number = request.GET.get('page')
+    if page_number is not None and 'cursor' not in request.GET:
+        page = Paginator(queryset, per_page).get_page(page_number)
+        page.cursor = ''
+        return page
+    return CursorPaginator(queryset, per_page).cursor_page(
+        request.GET.get('cursor')
+    )
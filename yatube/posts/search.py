@@ -0,0 +1,275 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Инвертированный индекс - виртуальные таблицы SQLite FTS5, по одной
+на посты и комментарии, с rowid равным id записи. Индекс обновляется
+сигналами в той же транзакции, что и сами записи, поэтому не
+расходится с базой. На других СУБД и на SQLite без FTS5 поиск
+откатывается на LIKE.
+"""
+import re
+
+from django.apps import apps as global_apps
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+POST_INDEX = 'posts_post_search'
+COMMENT_INDEX = 'posts_comment_search'
+TOKENIZER = 'unicode61 remove_diacritics 2'
+# Совпадение в тексте поста весит больше, чем в комментарии
+POST_WEIGHT = 2.0
+# Сколько лучших постов ранжируется для постраничного вывода
+MAX_RESULTS = 1000
+
+WORD = re.compile(r'\w+')
+
+
+def available(using=connection):
+    """Есть ли в базе индекс FTS5.
+
+    Ответ запоминается на соединении, чтобы не спрашивать схему
+    на каждое сохранение поста.
+    """
+    if using.vendor != 'sqlite':
+        return False
+    if getattr(using, 'search_index', None) is None:
+        using.search_index = POST_INDEX in using.introspection.table_names()
+    return using.search_index
+
+
+def create_index(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {POST_INDEX} '
+            f"USING fts5(text, tokenize='{TOKENIZER}')"
+        )
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENT_INDEX} '
+            f"USING fts5(text, post_id UNINDEXED, tokenize='{TOKENIZER}')"
+        )
+    using.search_index = True
+
+
+def drop_index(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {POST_INDEX}')
+        cursor.execute(f'DROP TABLE IF EXISTS {COMMENT_INDEX}')
+    using.search_index = False
+
+
+def fts_available(using=connection):
+    """Собран ли SQLite с модулем FTS5."""
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def match_query(query):
+    """Запрос FTS5 из строки пользователя.
+
+    Слова берутся в кавычки, чтобы операторы FTS5 в тексте не ломали
+    запрос; последнее слово ищется по префиксу - так работает поиск
+    по мере набора.
+    """
+    words = WORD.findall(query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_post(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {POST_INDEX} (rowid, text) '
+            'VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def unindex_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {POST_INDEX} WHERE rowid = %s', [post_id]
+        )
+
+
+def index_comment(comment):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {COMMENT_INDEX} (rowid, text, post_id) '
+            'VALUES (%s, %s, %s)',
+            [comment.pk, comment.text, comment.post_id]
+        )
+
+
+def unindex_comment(comment_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENT_INDEX} WHERE rowid = %s', [comment_id]
+        )
+
+
+def unindex_post_comments(post_id):
+    """Убирает из индекса все комментарии поста одним запросом."""
+    if not available():
+        return
+    Comment = global_apps.get_model('posts', 'Comment')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENT_INDEX} WHERE rowid IN ('
+            f'SELECT id FROM {Comment._meta.db_table} WHERE post_id = %s)',
+            [post_id]
+        )
+
+
+def search_posts(query, limit=MAX_RESULTS):
+    """id постов по убыванию релевантности.
+
+    Пост находится и по своему тексту, и по комментариям к нему;
+    ранг - лучший bm25 из совпадений.
+    """
+    match = match_query(query)
+    if not match:
+        return []
+    if not available():
+        Post = global_apps.get_model('posts', 'Post')
+        return list(
+            Post.objects.filter(
+                Q(text__icontains=query) | Q(comments__text__icontains=query)
+            ).distinct().order_by('-pub_date').values_list(
+                'pk', flat=True
+            )[:limit]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT post_id FROM ('
+            f'SELECT rowid AS post_id, bm25({POST_INDEX}) * %s AS rank '
+            f'FROM {POST_INDEX} WHERE {POST_INDEX} MATCH %s '
+            'UNION ALL '
+            f'SELECT post_id, bm25({COMMENT_INDEX}) AS rank '
+            f'FROM {COMMENT_INDEX} WHERE {COMMENT_INDEX} MATCH %s'
+            ') GROUP BY post_id ORDER BY MIN(rank) LIMIT %s',
+            [POST_WEIGHT, match, match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_comments(query, limit=MAX_RESULTS):
+    """id комментариев по убыванию релевантности."""
+    match = match_query(query)
+    if not match:
+        return []
+    if not available():
+        Comment = global_apps.get_model('posts', 'Comment')
+        return list(
+            Comment.objects.filter(text__icontains=query).values_list(
+                'pk', flat=True
+            )[:limit]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {COMMENT_INDEX} '
+            f'WHERE {COMMENT_INDEX} MATCH %s ORDER BY rank LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def matching(queryset, sql, params):
+    """Оставляет строки, id которых выдаёт подзапрос sql.
+
+    Условие - аннотация, а не pk__in=RawSQL: lookup in обернул бы
+    подзапрос во вторые скобки, и SQLite сравнил бы id с первой строкой.
+    """
+    column = f'{queryset.model._meta.db_table}.id'
+    return queryset.annotate(search_match=RawSQL(
+        f'{column} IN ({sql})', params, output_field=BooleanField()
+    )).filter(search_match=True)
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, найденные по тексту или комментариям.
+
+    Индекс проверяется подзапросом в том же SQL, без списка id и без
+    MAX_RESULTS, поэтому находятся все совпадения - так ищет админка.
+    """
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if not available():
+        return queryset.filter(pk__in=queryset.model.objects.filter(
+            Q(text__icontains=query) | Q(comments__text__icontains=query)
+        ).values('pk'))
+    return matching(
+        queryset,
+        f'SELECT rowid FROM {POST_INDEX} WHERE {POST_INDEX} MATCH %s '
+        f'UNION SELECT post_id FROM {COMMENT_INDEX} '
+        f'WHERE {COMMENT_INDEX} MATCH %s',
+        [match, match]
+    )
+
+
+def filter_comments(queryset, query):
+    """Все комментарии queryset, найденные поиском."""
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if not available():
+        return queryset.filter(text__icontains=query)
+    return matching(
+        queryset,
+        f'SELECT rowid FROM {COMMENT_INDEX} WHERE {COMMENT_INDEX} MATCH %s',
+        [match]
+    )
+
+
+def rebuild_search_index(apps=global_apps, using=connection):
+    """Заново строит индекс по всем постам и комментариям."""
+    if not fts_available(using):
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    create_index(using)
+    with using.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_INDEX}')
+        cursor.execute(f'DELETE FROM {COMMENT_INDEX}')
+        cursor.executemany(
+            f'INSERT INTO {POST_INDEX} (rowid, text) VALUES (%s, %s)',
+            Post.objects.using(using.alias).values_list('pk', 'text')
+            .iterator()
+        )
+        cursor.executemany(
+            f'INSERT INTO {COMMENT_INDEX} (rowid, text, post_id) '
+            'VALUES (%s, %s, %s)',
+            Comment.objects.using(using.alias).values_list(
+                'pk', 'text', 'post_id'
+            ).iterator()
+        )
+
+
+def search_page(query, number, per_page):
+    """Страница результатов поиска с постами в порядке релевантности.
+
+    Пагинатор считает только список id, посты загружаются одним
+    запросом для текущей страницы.
+    """
+    Post = global_apps.get_model('posts', 'Post')
+    page = Paginator(search_posts(query), per_page).get_page(number)
+    posts = Post.objects.feed().in_bulk(page.object_list)
+    page.object_list = [
+        posts[pk] for pk in page.object_list if pk in posts
+    ]
+    return page
@@ -0,0 +1,234 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.middleware import invalidate_pages
+
+from .counters import change_author_stats, change_counter
+from .deletion import deleting_posts
+from .feeds import (FOLLOW_FEED, GROUP_FEED, POST_PAGE, PROFILE_FEED,
+                    bump_feed_versions, feed_key, page_path, post_feed_keys,
+                    post_page_paths, profile_paths)
+from .models import Comment, Follow, Group, Post, User
+from .search import (index_comment, index_post, unindex_comment,
+                     unindex_post, unindex_post_comments)
+from .storage import release_image
+from .thumbnails import schedule_renditions
+from .timeline import backfill_timeline, fan_out_post, purge_timeline
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    """Запоминает автора и группу поста до редактирования."""
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = Post.objects.filter(pk=instance.pk).values(
+            'author_id', 'group_id', 'image'
+        ).first()
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_deleted_post_comments(sender, instance, **kwargs):
+    # Комментарии поста удаляются каскадом до него; индекс по ним
+    # чистится здесь одним запросом.
+    unindex_post_comments(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    keys = post_feed_keys(instance.author_id, instance.group_id)
+    keys.append(feed_key(POST_PAGE, instance.pk))
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        keys.extend(
+            post_feed_keys(previous['author_id'], previous['group_id'])
+        )
+    bump_feed_versions(keys)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    paths = post_page_paths(
+        instance.pk, instance.author_id, instance.group_id
+    )
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        paths.extend(post_page_paths(
+            instance.pk, previous['author_id'], previous['group_id']
+        ))
+    invalidate_pages(paths)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        previous = {'author_id': None, 'group_id': None, 'image': ''}
+    if previous['group_id'] != instance.group_id:
+        change_counter(
+            Group.objects.filter(pk=previous['group_id']), 'posts_count', -1
+        )
+        change_counter(
+            Group.objects.filter(pk=instance.group_id), 'posts_count', 1
+        )
+    if previous['author_id'] != instance.author_id:
+        if previous['author_id'] is not None:
+            change_author_stats(previous['author_id'], 'posts_count', -1)
+        change_author_stats(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def render_post_thumbnails(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None) or {'image': ''}
+    if instance.image and instance.image.name != previous['image']:
+        schedule_renditions(instance.image.name)
+    # Новая загрузка взяла свою ссылку, даже если байты те же.
+    if previous['image'] and (
+        previous['image'] != instance.image.name
+        or getattr(instance, '_image_uploaded', False)
+    ):
+        release_image(previous['image'])
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_counter(
+        Group.objects.filter(pk=instance.group_id), 'posts_count', -1
+    )
+    change_author_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        return
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        bump_feed_versions(
+            post_feed_keys(**post) + [feed_key(POST_PAGE, instance.post_id)]
+        )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        return
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        invalidate_pages(post_page_paths(instance.post_id, **post))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        return
+    change_counter(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1
+    )
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, **kwargs):
+    index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id not in deleting_posts():
+        unindex_comment(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    # Счётчики подписчиков и подписок - в профилях обоих пользователей.
+    bump_feed_versions([
+        feed_key(FOLLOW_FEED, instance.user_id),
+        feed_key(PROFILE_FEED, instance.author_id),
+        feed_key(PROFILE_FEED, instance.user_id),
+    ])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Счётчики подписок показываются в профилях обоих пользователей.
+    invalidate_pages(profile_paths(instance.author_id, instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_page(sender, instance, **kwargs):
+    # Название и описание - в шапке ленты группы и в её ETag.
+    bump_feed_versions([feed_key(GROUP_FEED, instance.pk)])
+    invalidate_pages([page_path('posts:group_list', instance.slug)])
+
+
+@receiver(post_save, sender=User)
+def invalidate_profile_page(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login, которого нет на страницах.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_feed_versions([feed_key(PROFILE_FEED, instance.pk)])
+    invalidate_pages([page_path('posts:profile', instance.username)])
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, 'followers_count', 1)
+        change_author_stats(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, 'followers_count', -1)
+    change_author_stats(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_follower_timeline(sender, instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def purge_follower_timeline(sender, instance, **kwargs):
+    purge_timeline(instance.user_id, instance.author_id)
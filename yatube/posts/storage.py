@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+
+from django.apps import apps as global_apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils.crypto import get_random_string
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - хэш его содержимого.
+
+    Файлы раскладываются по подкаталогам posts/ab/cd/<хэш>.<расширение>,
+    одинаковые загрузки ложатся в один файл, и у него один набор
+    миниатюр sorl-thumbnail.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно будет выбрано по содержимому в _save.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+        # Ссылка берётся до проверки файла: release_image не удалит
+        # его, пока она жива.
+        acquire_image(name)
+        if self.exists(name):
+            return name
+        content.seek(0)
+        # Файл пишется под временным именем и появляется под своим
+        # целиком. Цикл FileSystemStorage._save при FileExistsError
+        # просил бы новое имя у get_available_name и получал бы то же.
+        temporary = super()._save(
+            f'{name}.{get_random_string(8)}.tmp', content
+        )
+        try:
+            os.link(self.path(temporary), self.path(name))
+        except FileExistsError:
+            # Те же байты только что сохранила другая загрузка.
+            pass
+        finally:
+            os.remove(self.path(temporary))
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
+
+
+def acquire_image(name):
+    """Увеличивает счётчик ссылок на файл картинки."""
+    from .models import ImageReference
+
+    # Строку может удалить release_image между двумя запросами.
+    while not ImageReference.objects.filter(name=name).update(
+        count=F('count') + 1
+    ):
+        ImageReference.objects.get_or_create(name=name)
+
+
+def release_image(name):
+    """Удаляет файл и его миниатюры, если на него больше нет ссылок.
+
+    Счётчик проверяется и файл удаляется в одной транзакции с
+    блокировкой строки счётчика: одновременная загрузка тех же байтов
+    ждёт её конца и потом пишет файл заново, а если она успела взять
+    ссылку раньше, файл не удаляется.
+    """
+    from .models import ImageReference, Post
+
+    def release():
+        with transaction.atomic():
+            ImageReference.objects.get_or_create(name=name)
+            references = ImageReference.objects.filter(name=name)
+            # Строка заблокирована до конца транзакции; в SQLite ту же
+            # роль играет блокировка базы на запись после UPDATE.
+            list(references.select_for_update())
+            references.filter(count__gt=0).update(count=F('count') - 1)
+            # Посты с этим именем без счётчика - записанные в обход
+            # хранилища, например фикстурами.
+            if (
+                references.filter(count__gt=0).exists()
+                or Post.objects.filter(image=name).exists()
+            ):
+                return
+            references.delete()
+            try:
+                # Вместе с записью kvstore удаляются и файлы миниатюр.
+                default.kvstore.delete(ImageFile(name, post_image_storage))
+                post_image_storage.delete(name)
+            except (SuspiciousFileOperation, OSError):
+                # Путь вне MEDIA_ROOT или файл уже недоступен.
+                logger.warning('Не удалось удалить картинку %s', name)
+
+    if name:
+        transaction.on_commit(release)
+
+
+def rebuild_image_references(apps=global_apps):
+    """Пересчитывает ссылки на картинки по постам."""
+    Post = apps.get_model('posts', 'Post')
+    ImageReference = apps.get_model('posts', 'ImageReference')
+    with transaction.atomic():
+        ImageReference.objects.all().delete()
+        ImageReference.objects.bulk_create(
+            ImageReference(name=row['image'], count=row['total'])
+            for row in Post.objects.exclude(image='').exclude(
+                image__isnull=True
+            ).order_by().values('image').annotate(total=Count('pk'))
+        )
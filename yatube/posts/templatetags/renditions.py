@@ -0,0 +1,66 @@
+from django import template
+from django.templatetags.static import static
+
+from ..thumbnails import (PLACEHOLDER, backend, modern_formats,
+                          schedule_renditions, variants)
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(image, geometry, **options):
+    """URL готовой миниатюры картинки.
+
+    Миниатюры создаёт фоновый воркер, поэтому запрос не ждёт их генерации:
+    пока миниатюры нет, показываем заглушку.
+    """
+    if not image:
+        return ''
+    thumbnail = backend.lookup(image, geometry, **options)
+    if thumbnail is None:
+        schedule_renditions(image.name)
+        return static(PLACEHOLDER)
+    return thumbnail.url
+
+
+def srcset(candidates):
+    return ', '.join(f'{url} {size}w' for url, size in candidates)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def responsive_rendition(image, geometry, css_class='', **options):
+    """Картинка с srcset из нескольких ширин и современных форматов.
+
+    В srcset попадают только готовые миниатюры; если нет ни одной
+    в основном формате, показываем заглушку и ставим генерацию в очередь.
+    """
+    width = geometry.partition('x')[0]
+    srcsets = {}
+    missing = False
+    for image_format, size, variant, variant_options in variants(
+        geometry, **options
+    ):
+        thumbnail = backend.lookup(image, variant, **variant_options)
+        if thumbnail is None:
+            missing = True
+            continue
+        srcsets.setdefault(image_format, []).append(
+            (thumbnail.url, size)
+        )
+    if missing:
+        schedule_renditions(image.name)
+    candidates = srcsets.get(None)
+    if not candidates:
+        return {'css_class': css_class, 'src': static(PLACEHOLDER)}
+    return {
+        'css_class': css_class,
+        # Самая широкая миниатюра - для браузеров без srcset.
+        'src': candidates[-1][0],
+        'srcset': srcset(candidates),
+        'sizes': f'(max-width: {width}px) 100vw, {width}px',
+        'sources': [
+            {'type': mime_type, 'srcset': srcset(srcsets[image_format])}
+            for image_format, mime_type in modern_formats()
+            if image_format in srcsets
+        ],
+    }
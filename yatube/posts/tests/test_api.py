@@ -0,0 +1,138 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Первый пост'
+        )
+        for number in range(12):
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_walk_by_cursor(self):
+        urls = (
+            reverse('api:index'),
+            reverse('api:profile_posts', args=[self.author.username]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(len(first['results']), 10)
+                rest = self.client.get(
+                    url, {'cursor': first['next_cursor']}
+                ).json()
+                self.assertEqual(len(rest['results']), 3)
+                self.assertEqual(rest['next_cursor'], '')
+
+    def test_post_payload(self):
+        response = self.client.get(
+            reverse('api:post_detail', args=[self.post.pk])
+        )
+        self.assertEqual(response.json(), {
+            'id': self.post.pk,
+            'text': 'Первый пост',
+            'pub_date': response.json()['pub_date'],
+            'image': None,
+            'comments_count': 0,
+            'author': {'username': 'author', 'full_name': 'Лев Толстой'},
+            'group': {'slug': 'group', 'title': 'Группа'},
+        })
+
+    def test_feed_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api:index'))
+
+    def test_group_feed(self):
+        data = self.client.get(
+            reverse('api:group_posts', args=[self.group.slug])
+        ).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']], [self.post.pk]
+        )
+
+    def test_follow_feed_requires_login(self):
+        url = reverse('api:follow_posts')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        data = self.reader_client.get(url).json()
+        self.assertEqual(len(data['results']), 10)
+
+    def test_unknown_post(self):
+        response = self.client.get(reverse('api:post_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ApiWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_add_and_list_comments(self):
+        url = reverse('api:post_comments', args=[self.post.pk])
+        response = self.reader_client.post(
+            url, json.dumps({'text': 'Отличный пост'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'reader')
+        self.assertTrue(Comment.objects.filter(text='Отличный пост').exists())
+        data = self.client.get(url).json()
+        self.assertEqual(data['results'][0]['text'], 'Отличный пост')
+
+    def test_invalid_comment(self):
+        url = reverse('api:post_comments', args=[self.post.pk])
+        response = self.reader_client.post(
+            url, json.dumps({'text': ''}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_guest_cannot_comment(self):
+        url = reverse('api:post_comments', args=[self.post.pk])
+        response = self.client.post(url, {'text': 'Гость'})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_follow_and_unfollow(self):
+        url = reverse('api:follow', args=[self.author.username])
+        self.assertEqual(self.reader_client.post(url).status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+        self.assertEqual(self.reader_client.post(url).status_code, 200)
+        response = self.reader_client.delete(url)
+        self.assertEqual(response.json(), {'following': False})
+        self.assertFalse(Follow.objects.exists())
+
+    def test_cannot_follow_self(self):
+        url = reverse('api:follow', args=[self.reader.username])
+        self.assertEqual(self.reader_client.post(url).status_code, 400)
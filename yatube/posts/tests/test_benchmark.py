@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from ..benchmark import (GROUP_PREFIX, MIX, READER_PREFIX, USER_PREFIX,
+                         Replay, compare, delete_generated, generate,
+                         parse_mix, percentile)
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry, User)
+
+
+class GenerateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = generate(
+            users=30, posts=300, groups=3, follows=5, readers=3,
+            hot_posts=2, hot_comments=20, batch_size=50,
+        )
+
+    def setUp(self):
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+
+    def test_rows_are_created(self):
+        self.assertEqual(self.counts['posts'], 300)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(User.objects.count(), 33)
+        self.assertEqual(self.counts['follows'], Follow.objects.count())
+        hot = Post.objects.order_by('-pk')[:2]
+        self.assertEqual([post.comments_count for post in hot], [20, 20])
+        # Новые посты получают большие id.
+        self.assertEqual(
+            Post.objects.order_by('-pub_date').first().pk,
+            Post.objects.order_by('-pk').first().pk,
+        )
+
+    def test_readers_have_timelines(self):
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username__startswith=READER_PREFIX
+        ).exists())
+
+    def test_second_run_is_refused(self):
+        with self.assertRaises(ValueError):
+            generate(users=1, posts=1, readers=0)
+
+    def test_delete_generated_keeps_other_data(self):
+        user = User.objects.create_user(username='user')
+        group = Group.objects.get(slug=f'{GROUP_PREFIX}0')
+        post = Post.objects.create(author=user, group=group, text='Пост')
+        Comment.objects.create(
+            post=Post.objects.exclude(pk=post.pk).first(),
+            author=user, text='Комментарий'
+        )
+        Follow.objects.create(
+            user=user, author=User.objects.get(username=f'{USER_PREFIX}0')
+        )
+        delete_generated()
+        self.assertEqual(list(User.objects.all()), [user])
+        self.assertEqual(list(Post.objects.all()), [post])
+        self.assertFalse(Group.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        post.refresh_from_db()
+        self.assertIsNone(post.group)
+        stats = AuthorStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.following_count), (1, 0)
+        )
+
+    def test_replay_pages_with_cursor(self):
+        replay = Replay(clients=1)
+        for _ in range(200):
+            endpoint, _, _, _, data = replay.next_request()
+            self.assertNotIn('page', data)
+            if 'cursor' in data:
+                self.assertIn(endpoint, ('index', 'group_list', 'profile',
+                                         'follow_index'))
+
+    def test_replay_report(self):
+        result = Replay(clients=2).run(60, warmup=5)
+        self.assertEqual(result['requests'], 60)
+        self.assertEqual(set(result['endpoints']), set(MIX))
+        for endpoint, values in result['endpoints'].items():
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(values['errors'], 0)
+                self.assertLessEqual(values['p50_ms'], values['p99_ms'])
+                self.assertGreater(values['queries_max'], 0)
+        self.assertEqual(
+            compare(result, result)['overall']['p95_ms'], 1.0
+        )
+
+
+class HelpersTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_parse_mix(self):
+        self.assertEqual(
+            parse_mix('index=3,add_comment=1'),
+            {'index': 3, 'add_comment': 1}
+        )
+        with self.assertRaises(ValueError):
+            parse_mix('admin=1')
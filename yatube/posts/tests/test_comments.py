@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..paginators import COMMENTS_PER_PAGE
+
+User = get_user_model()
+
+COMMENTS_COUNT = COMMENTS_PER_PAGE + 5
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        users = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(COMMENTS_COUNT)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=user, text=f'Комментарий {number}')
+            for number, user in enumerate(users)
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_detail_shows_first_batch(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.next_cursor)
+        self.assertContains(response, 'js-more-comments')
+
+    def test_authors_are_loaded_with_comments(self):
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        # Поиск поста и одна выборка комментариев вместе с авторами.
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_fragment_returns_next_batch(self):
+        first = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk])
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': first.next_cursor}
+        )
+        rest = response.context['comments']
+        self.assertEqual(len(rest), COMMENTS_COUNT - COMMENTS_PER_PAGE)
+        self.assertEqual(rest.next_cursor, '')
+        self.assertNotContains(response, 'js-more-comments')
+        self.assertFalse(
+            {comment.pk for comment in first}
+            & {comment.pk for comment in rest}
+        )
+
+    def test_fragment_as_json(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'format': 'json'}
+        )
+        data = response.json()
+        self.assertEqual(len(data['comments']), COMMENTS_PER_PAGE)
+        self.assertEqual(
+            set(data['comments'][0]), {'id', 'author', 'text', 'created'}
+        )
+        self.assertTrue(data['next_cursor'])
+
+    def test_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
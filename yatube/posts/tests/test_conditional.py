@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        caches['feeds'].clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_not_rendered(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.revalidate(self.client, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_follow_feed(self):
+        response = self.revalidate(
+            self.reader_client, reverse('posts:follow_index')
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_comment_changes_etag(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_edited_post_changes_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_new_follower_changes_profile_etag(self):
+        """Подписка меняет счётчики в профилях автора и подписчика."""
+        fan = User.objects.create_user(username='fan')
+        urls = [
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:profile', args=[fan.username]),
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Follow.objects.create(user=fan, author=self.author)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_edited_author_and_group_change_etag(self):
+        """Имя автора и описание группы - в шапках их страниц."""
+        edits = (
+            (reverse('posts:profile', args=[self.author.username]),
+             User.objects.get(pk=self.author.pk), 'first_name', 'Лев'),
+            (reverse('posts:group_list', args=[self.group.slug]),
+             Group.objects.get(pk=self.group.pk), 'description',
+             'Новое описание'),
+        )
+        for url, instance, field, value in edits:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                setattr(instance, field, value)
+                instance.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, value)
+
+    def test_login_keeps_profile_etag(self):
+        url = reverse('posts:profile', args=[self.reader.username])
+        etag = self.client.get(url)['ETag']
+        Client().force_login(self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_differs_per_user(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.reader_client.get(url)['ETag']
+        )
+
+    def test_unknown_pages_have_no_etag(self):
+        response = self.client.get(
+            reverse('posts:group_list', args=['missing'])
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
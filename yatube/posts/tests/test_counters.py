@@ -0,0 +1,133 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..deletion import deleting_posts
+from ..models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug-2',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, posts, group, group_2, followers, following):
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        author = AuthorStats.for_user(
+            User.objects.select_related('stats').get(pk=self.author.pk))
+        reader = AuthorStats.for_user(
+            User.objects.select_related('stats').get(pk=self.reader.pk))
+        self.assertEqual(author.posts_count, posts)
+        self.assertEqual(self.group.posts_count, group)
+        self.assertEqual(self.group_2.posts_count, group_2)
+        self.assertEqual(author.followers_count, followers)
+        self.assertEqual(reader.following_count, following)
+
+    def test_counters_follow_create_edit_delete(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group)
+        Post.objects.create(text='Пост без группы', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCounters(2, 1, 0, 1, 1)
+
+        post.group = self.group_2
+        post.save()
+        self.assertCounters(2, 0, 1, 1, 1)
+
+        comment = Comment.objects.create(
+            text='Комментарий', post=post, author=self.reader)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+        post.delete()
+        follow.delete()
+        self.assertCounters(1, 0, 0, 0, 0)
+
+    def test_post_delete_skips_comment_handlers(self):
+        """Удаление поста не правит счётчик и кэш на каждый комментарий."""
+        queries = []
+        for total in (1, 10):
+            post = Post.objects.create(text='Пост', author=self.author)
+            Comment.objects.bulk_create(
+                Comment(text='Комментарий', post=post, author=self.reader)
+                for _ in range(total)
+            )
+            with CaptureQueriesContext(connection) as captured:
+                post.delete()
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_failed_post_delete_clears_mark(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        comments = [
+            Comment.objects.create(
+                text='Комментарий', post=post, author=self.reader)
+            for _ in range(2)
+        ]
+
+        def fail(sender, **kwargs):
+            raise RuntimeError('сбой посреди каскада')
+
+        post_delete.connect(fail, sender=Comment)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                post.delete()
+        finally:
+            post_delete.disconnect(fail, sender=Comment)
+        self.assertEqual(deleting_posts(), set())
+        comments[0].delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_deleted_user_comments_update_other_posts(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(
+            text='Комментарий', post=post, author=self.reader)
+        Comment.objects.create(
+            text='Комментарий', post=post, author=self.author)
+        reader = User.objects.create_user(username='other')
+        Comment.objects.create(text='Комментарий', post=post, author=reader)
+        reader.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+
+    def test_rebuild_counters_command(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group)
+        Comment.objects.create(
+            text='Комментарий', post=post, author=self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        # Сбиваем счётчики в обход сигналов.
+        Post.objects.bulk_create(
+            [Post(text='Массовый пост', author=self.author, group=self.group)]
+        )
+        Post.objects.update(comments_count=0)
+        AuthorStats.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertCounters(2, 2, 0, 1, 1)
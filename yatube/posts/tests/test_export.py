@@ -0,0 +1,107 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..export import TABLES
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0],
+            author=cls.reader,
+            text='Комментарий, "с" запятой',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_contains_every_table(self):
+        response = self.staff_client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        records = [
+            json.loads(line)
+            for line in self.read(response).decode().splitlines()
+        ]
+        types = [record['type'] for record in records]
+        self.assertEqual(types.count('posts'), 5)
+        self.assertEqual(types.count('comments'), 1)
+        self.assertEqual(types.count('follows'), 1)
+        self.assertEqual(records[0]['text'], 'Пост 0')
+
+    def test_csv_single_table(self):
+        response = self.staff_client.get(
+            reverse('posts:export'), {'table': 'comments', 'format': 'csv'}
+        )
+        rows = list(csv.reader(io.StringIO(self.read(response).decode())))
+        self.assertEqual(rows[0], ['id', 'post_id', 'author_id', 'created',
+                                   'text'])
+        self.assertEqual(rows[1][-1], 'Комментарий, "с" запятой')
+
+    def test_csv_rejects_several_tables(self):
+        response = self.staff_client.get(
+            reverse('posts:export'),
+            {'table': ['posts', 'comments'], 'format': 'csv'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_gzip(self):
+        response = self.staff_client.get(
+            reverse('posts:export'), {'table': 'posts', 'gzip': '1'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('posts.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(self.read(response)).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_staff_only(self):
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command_writes_file_in_small_chunks(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'posts.ndjson.gz')
+        call_command(
+            'export_content', 'posts', gzip=True, output=path, chunk_size=2
+        )
+        with gzip.open(path, 'rt', encoding='utf-8') as export:
+            ids = [json.loads(line)['id'] for line in export]
+        self.assertEqual(ids, [post.pk for post in self.posts])
+
+    def test_command_exports_every_table_by_default(self):
+        output = io.StringIO()
+        call_command('export_content', stdout=output)
+        types = {
+            json.loads(line)['type'] for line in output.getvalue().splitlines()
+        }
+        self.assertEqual(types, set(TABLES))
+        with self.assertRaises(CommandError):
+            call_command('export_content', 'likes', stdout=io.StringIO())
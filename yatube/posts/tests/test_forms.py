@@ -1,9 +1,12 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
+from PIL import Image
 from django.urls import reverse
 
 from ..forms import PostForm
@@ -76,3 +79,50 @@ class PostCreateFormTests(TestCase):
                                      kwargs={'post_id': self.post.id}))
         self.assertTrue(self.post.text,
                         'Текст пост изм')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=(100, 100))
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, mode, image_format, name):
+        image = Image.new(mode, (400, 200))
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        buffer = BytesIO()
+        image.save(buffer, image_format, exif=exif.tobytes())
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': SimpleUploadedFile(
+                name, buffer.getvalue(), f'image/{image_format.lower()}')},
+        )
+        post = Post.objects.latest('pk')
+        return post, Image.open(post.image.path)
+
+    def test_upload_is_downscaled_and_stripped(self):
+        """Загрузка уменьшается, теряет EXIF и называется по хэшу."""
+        post, image = self.upload('RGB', 'JPEG', 'photo.jpeg')
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertFalse(image.getexif())
+        self.assertRegex(
+            post.image.name,
+            r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$'
+        )
+
+    def test_transparent_upload_keeps_alpha(self):
+        post, image = self.upload('RGBA', 'PNG', 'logo.png')
+        self.assertIn(image.format, ('PNG', 'WEBP'))
+        self.assertEqual(image.mode, 'RGBA')
@@ -0,0 +1,231 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from ..importer import Importer, read_records
+from ..models import AuthorStats, Comment, Follow, Group, Post, TimelineEntry
+from ..search import search_posts
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        return path
+
+    def ndjson(self, name, records):
+        return self.write(name, ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records
+        ))
+
+    def test_ndjson_with_every_table(self):
+        User.objects.create_user(username='old')
+        path = self.ndjson('archive.ndjson', [
+            {'type': 'users', 'username': 'writer', 'first_name': 'Лев'},
+            {'type': 'users', 'username': 'old'},
+            {'type': 'groups', 'slug': 'cats', 'title': 'Коты'},
+            {
+                'type': 'posts', 'id': 10, 'author': 'writer',
+                'group': 'cats', 'text': 'Архивный пост про котов',
+                'pub_date': '2015-03-01T12:00:00+00:00',
+            },
+            {'type': 'posts', 'author': 'newcomer', 'text': 'Новый пост'},
+            {
+                'type': 'comments', 'post_id': 10, 'author': 'old',
+                'text': 'Комментарий', 'created': '2015-03-02T08:00:00Z',
+            },
+            {'type': 'follows', 'user': 'old', 'author': 'writer'},
+        ])
+        # Пачки меньше записей: ссылки должны разрешаться между пачками.
+        counts = Importer(batch_size=2).run(read_records(path))
+        self.assertEqual(counts, {
+            'users': 2, 'groups': 1, 'posts': 2, 'comments': 1, 'follows': 1,
+        })
+        self.assertEqual(User.objects.filter(username='old').count(), 1)
+        self.assertEqual(
+            User.objects.get(username='writer').first_name, 'Лев'
+        )
+        self.assertFalse(
+            User.objects.get(username='newcomer').has_usable_password()
+        )
+        post = Post.objects.get(pk=10)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(
+            post.pub_date, parse_datetime('2015-03-01T12:00:00+00:00')
+        )
+        self.assertEqual(Post.objects.get(text='Новый пост').pk, 11)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.created.year, 2015)
+        self.assertTrue(Follow.objects.filter(
+            user__username='old', author__username='writer'
+        ).exists())
+
+    def test_derived_data_is_rebuilt(self):
+        path = self.ndjson('archive.ndjson', [
+            {'type': 'groups', 'slug': 'cats', 'title': 'Коты'},
+            {
+                'type': 'posts', 'id': 1, 'author': 'writer',
+                'group': 'cats', 'text': 'Полосатый кот',
+            },
+            {
+                'type': 'comments', 'post_id': 1, 'author': 'reader',
+                'text': 'Мурлычет',
+            },
+            {'type': 'follows', 'user': 'reader', 'author': 'writer'},
+        ])
+        Importer().run(read_records(path))
+        post = Post.objects.get(pk=1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Group.objects.get(slug='cats').posts_count, 1)
+        stats = AuthorStats.objects.get(user__username='writer')
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (1, 1)
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post=post
+        ).exists())
+        self.assertEqual(search_posts('полосатый'), [1])
+        self.assertEqual(search_posts('мурлычет'), [1])
+
+    def test_batch_larger_than_sqlite_insert_limit(self):
+        """SQLite вставляет не больше 500 строк одним INSERT ... SELECT."""
+        path = self.ndjson('archive.ndjson', [
+            {'type': 'posts', 'author': f'author{number}', 'text': 'Пост'}
+            for number in range(600)
+        ])
+        Importer().run(read_records(path))
+        self.assertEqual(Post.objects.count(), 600)
+        self.assertEqual(AuthorStats.objects.count(), 600)
+
+    def test_csv_posts(self):
+        author = User.objects.create_user(username='writer')
+        path = self.write(
+            'posts.csv',
+            'id,author_id,group_id,pub_date,text,image\n'
+            f'5,{author.pk},,2020-01-01T00:00:00+00:00,"Текст, с запятой",\n'
+        )
+        call_command(
+            'import_content', path, table='posts', stdout=io.StringIO()
+        )
+        post = Post.objects.get(pk=5)
+        self.assertEqual(post.text, 'Текст, с запятой')
+        self.assertIsNone(post.group_id)
+        self.assertEqual(post.pub_date.year, 2020)
+
+    def test_csv_requires_table(self):
+        path = self.write('posts.csv', 'id,text\n')
+        with self.assertRaises(CommandError):
+            call_command('import_content', path, stdout=io.StringIO())
+
+    def test_generated_ids_skip_ids_later_in_file(self):
+        path = self.ndjson('archive.ndjson', [
+            {'type': 'posts', 'author': 'writer', 'text': 'Без id'},
+            {'type': 'posts', 'id': 1, 'author': 'writer', 'text': 'Первый'},
+            {
+                'type': 'comments', 'post_id': 1, 'author': 'writer',
+                'text': 'Без id',
+            },
+            {
+                'type': 'comments', 'id': 1, 'post_id': 1,
+                'author': 'writer', 'text': 'С id',
+            },
+        ])
+        Importer(batch_size=1).run(read_records(path))
+        self.assertEqual(Post.objects.get(pk=1).text, 'Первый')
+        self.assertEqual(Post.objects.get(pk=2).text, 'Без id')
+        self.assertEqual(Comment.objects.get(pk=1).text, 'С id')
+        self.assertEqual(Comment.objects.get(pk=2).text, 'Без id')
+
+    def test_dates_do_not_change_model_fields(self):
+        path = self.ndjson('archive.ndjson', [
+            {
+                'type': 'posts', 'id': 1, 'author': 'writer', 'text': 'Пост',
+                'pub_date': '2015-03-01T12:00:00+00:00',
+            },
+        ])
+        Importer().run(read_records(path))
+        self.assertEqual(Post.objects.get(pk=1).pub_date.year, 2015)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        post = Post.objects.create(
+            author=User.objects.get(username='writer'), text='Новый'
+        )
+        self.assertGreater(post.pub_date.year, 2015)
+
+    def test_malformed_date_is_reported_with_line(self):
+        for date in ('вчера', '2020-02-30T00:00:00'):
+            with self.subTest(date=date):
+                path = self.ndjson('archive.ndjson', [
+                    {'type': 'users', 'username': 'writer'},
+                    {
+                        'type': 'posts', 'author': 'writer', 'text': 'Пост',
+                        'pub_date': date,
+                    },
+                ])
+                with self.assertRaisesMessage(CommandError, 'Строка 2'):
+                    call_command(
+                        'import_content', path, stdout=io.StringIO()
+                    )
+
+    def test_database_error_rolls_back_every_batch(self):
+        path = self.ndjson('archive.ndjson', [
+            {'type': 'posts', 'id': 1, 'author': 'writer', 'text': 'Пост'},
+            {'type': 'posts', 'id': 2, 'author': 'writer', 'text': 'Пост'},
+            # Вторая пачка: пост с тем же id нарушает первичный ключ.
+            {'type': 'posts', 'id': 1, 'author': 'writer', 'text': 'Дубль'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'Загрузка отменена'):
+            call_command(
+                'import_content', path, batch_size=2, stdout=io.StringIO()
+            )
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(User.objects.filter(username='writer').exists())
+
+    def test_unknown_record_type(self):
+        path = self.ndjson('archive.ndjson', [{'type': 'likes'}])
+        with self.assertRaises(CommandError):
+            call_command('import_content', path, stdout=io.StringIO())
+
+    def test_images_are_copied_to_storage(self):
+        Image.new('RGB', (4, 4), 'red').save(
+            os.path.join(self.directory, 'red.png')
+        )
+        path = self.ndjson('archive.ndjson', [
+            {
+                'type': 'posts', 'id': 1, 'author': 'writer',
+                'text': 'С картинкой', 'image': 'red.png',
+            },
+            {
+                'type': 'posts', 'id': 2, 'author': 'writer',
+                'text': 'Картинка потерялась', 'image': 'missing.png',
+            },
+        ])
+        with self.assertLogs('posts.importer', 'WARNING'):
+            Importer(image_root=self.directory).run(read_records(path))
+        post = Post.objects.get(pk=1)
+        self.assertRegex(post.image.name, r'^posts/[0-9a-f/]+\.\w+$')
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertFalse(Post.objects.get(pk=2).image)
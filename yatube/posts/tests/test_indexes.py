@@ -0,0 +1,150 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post
+from ..paginators import CursorPaginator
+from ..timeline import follow_page
+from ..views import comments_page
+
+User = get_user_model()
+
+PER_PAGE = 10
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class FeedIndexTests(TestCase):
+    """Запросы лент ищут по индексам, без полного скана и сортировки.
+
+    Запросы строят те же функции, что и view, и план проверяется
+    у каждого запроса, который они выполнили.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for number in range(PER_PAGE + 2):
+            post = Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {number}'
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+        cls.post = post
+        for number in range(PER_PAGE + 2):
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {number}'
+            )
+
+    def plans(self, read):
+        """Планы всех запросов, которые выполнила read()."""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            page = read()
+        plans = []
+        with connection.cursor() as cursor:
+            for sql, params in queries:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plans.append([row[-1] for row in cursor.fetchall()])
+        return page, plans
+
+    def assertSeeks(self, read, table, index):
+        """Таблица table читается поиском по индексу index.
+
+        SCAN ... USING INDEX - полный проход по индексу, а не поиск,
+        поэтому нужен именно SEARCH. Сортировки во временном B-дереве
+        не должно быть ни в одном запросе.
+        """
+        page, plans = self.plans(read)
+        steps = [step for plan in plans for step in plan]
+        self.assertTrue(
+            any(
+                step.startswith(f'SEARCH {table} ')
+                and f'INDEX {index} ' in step
+                for step in steps
+            ),
+            plans
+        )
+        for step in steps:
+            self.assertNotIn('TEMP B-TREE', step, plans)
+            self.assertFalse(step.startswith('SCAN '), plans)
+        return page
+
+    def feed(self, queryset, index):
+        page = self.assertSeeks(
+            lambda: CursorPaginator(queryset, PER_PAGE).cursor_page(),
+            'posts_post', index
+        )
+        self.next_page(queryset, page, index)
+
+    def next_page(self, queryset, page, index):
+        self.assertSeeks(
+            lambda: CursorPaginator(queryset, PER_PAGE).cursor_page(
+                page.next_cursor
+            ),
+            'posts_post', index
+        )
+
+    def test_index_feed(self):
+        # У первой страницы общей ленты нет условия для поиска: она
+        # читается по индексу в его порядке и останавливается на LIMIT.
+        queryset = Post.objects.feed()
+        page, plans = self.plans(
+            lambda: CursorPaginator(queryset, PER_PAGE).cursor_page()
+        )
+        self.assertEqual(
+            plans[0][0], 'SCAN posts_post USING INDEX post_pub_date_idx'
+        )
+        self.assertNotIn('TEMP B-TREE', str(plans))
+        self.next_page(queryset, page, 'post_pub_date_idx')
+
+    def test_group_feed(self):
+        self.feed(
+            Post.objects.feed().filter(group=self.group),
+            'post_group_pub_date_idx'
+        )
+
+    def test_profile_feed(self):
+        self.feed(
+            Post.objects.feed().filter(author=self.user),
+            'post_author_pub_date_idx'
+        )
+
+    def test_post_comments(self):
+        page = self.assertSeeks(
+            lambda: comments_page(self.post.pk, None),
+            'posts_comment', 'comment_post_created_id_idx'
+        )
+        self.assertSeeks(
+            lambda: comments_page(self.post.pk, page.next_cursor),
+            'posts_comment', 'comment_post_created_id_idx'
+        )
+
+    def test_follow_feed(self):
+        page = self.assertSeeks(
+            lambda: follow_page(self.reader),
+            'posts_timelineentry', 'timeline_user_date_post_idx'
+        )
+        self.assertSeeks(
+            lambda: follow_page(self.reader, page.next_cursor),
+            'posts_timelineentry', 'timeline_user_date_post_idx'
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_follow_feed_celebrity_posts(self):
+        self.assertSeeks(
+            lambda: follow_page(self.reader),
+            'posts_post', 'post_author_pub_date_idx'
+        )
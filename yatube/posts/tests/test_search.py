@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..search import (MAX_RESULTS, available, match_query,
+                      rebuild_search_index, search_comments, search_posts)
+
+User = get_user_model()
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Путешествие по Байкалу зимой'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Рецепт пирога с яблоками'
+        )
+
+    def test_index_is_built(self):
+        self.assertTrue(available())
+
+    def test_post_is_found_by_word_and_prefix(self):
+        self.assertEqual(search_posts('байкалу'), [self.post.pk])
+        self.assertEqual(search_posts('Пиро'), [self.other.pk])
+
+    def test_edit_and_delete_update_index(self):
+        post = Post.objects.create(author=self.user, text='Рецепт щей')
+        post.text = 'Рецепт блинов'
+        post.save()
+        self.assertEqual(search_posts('щей'), [])
+        self.assertEqual(search_posts('блинов'), [post.pk])
+        post.delete()
+        self.assertEqual(search_posts('блинов'), [])
+
+    def test_comments_lead_to_their_post(self):
+        comment = Comment.objects.create(
+            post=self.other, author=self.user, text='Байкал прекрасен'
+        )
+        self.assertEqual(search_comments('байкал'), [comment.pk])
+        # Совпадение в тексте поста важнее совпадения в комментарии.
+        self.assertEqual(
+            search_posts('байкал'), [self.post.pk, self.other.pk]
+        )
+        comment.delete()
+        self.assertEqual(search_comments('байкал'), [])
+
+    def test_deleted_post_takes_its_comments_from_index(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.create(
+            post=post, author=self.user, text='Омуль копчёный'
+        )
+        post.delete()
+        self.assertEqual(search_comments('омуль'), [])
+
+    def test_operators_in_query_are_escaped(self):
+        self.assertEqual(match_query('NOT "пирог" OR'), '"NOT" "пирог" "OR"*')
+        self.assertEqual(search_posts('пирог OR'), [])
+        self.assertEqual(search_posts('***'), [])
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Заметка номер {number}')
+            for number in range(12)
+        )
+        # bulk_create не шлёт сигналы, индекс собираем явно.
+        rebuild_search_index()
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_results_are_paginated(self):
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'заметка'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 12)
+        self.assertEqual(len(page_obj), 10)
+        self.assertIsInstance(page_obj[0], Post)
+        response = self.client.get(url, {'q': 'заметка', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_empty_query_shows_form(self):
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_admin_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'номер 11'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_admin_finds_more_than_max_results(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Сводка {number}')
+            for number in range(MAX_RESULTS + 5)
+        )
+        rebuild_search_index()
+        Comment.objects.create(
+            post=Post.objects.get(text='Заметка номер 0'), author=self.user,
+            text='Тоже сводка'
+        )
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'сводка'}
+        )
+        self.assertEqual(response.context['cl'].result_count, MAX_RESULTS + 6)
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'сводка'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
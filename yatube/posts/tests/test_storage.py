@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from ..models import ImageReference, Post
+from ..storage import acquire_image, post_image_storage
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.thumbnails.submit', mock.Mock())
+@mock.patch('posts.storage.transaction.on_commit',
+            lambda callback: callback())
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name,
+            r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$'
+        )
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_file_removed_with_last_reference(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.image = None
+        second.save()
+        self.assertFalse(os.path.exists(path))
+
+    def test_concurrent_identical_upload_keeps_existing_file(self):
+        """Файл с тем же именем уже записан: загрузка берёт его."""
+        first = self.create_post('first.gif')
+        with mock.patch.object(
+            post_image_storage, 'exists', return_value=False
+        ):
+            second = self.create_post('second.gif')
+        self.assertEqual(second.image.name, first.image.name)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+
+    def test_release_keeps_file_referenced_by_new_upload(self):
+        """Загрузка тех же байтов до коммита своего поста не теряет файл."""
+        post = self.create_post('first.gif')
+        path = post.image.path
+        # Ссылку уже взяла загрузка, чей пост ещё не сохранён.
+        acquire_image(post.image.name)
+        post.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(
+            ImageReference.objects.get(name=post.image.name).count, 1
+        )
+
+    def test_reupload_of_same_bytes_keeps_count(self):
+        post = self.create_post('first.gif')
+        post.image = SimpleUploadedFile('again.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        path = post.image.path
+        self.assertEqual(
+            ImageReference.objects.get(name=post.image.name).count, 1
+        )
+        post.delete()
+        self.assertFalse(os.path.exists(path))
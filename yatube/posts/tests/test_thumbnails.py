@@ -0,0 +1,180 @@
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..feeds import POST_PAGE, get_feed_version
+from ..models import Post
+from ..thumbnails import (PLACEHOLDER, backend, generate_renditions, render,
+                          variants)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RenditionTagTests(TestCase):
+    template = Template(
+        '{% load renditions %}'
+        '{% rendition post.image "960x339" crop="center" upscale=True %}'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def render(self):
+        return self.template.render(Context({'post': self.post}))
+
+    def test_new_image_is_rendered_in_background(self):
+        """Сохранение поста ставит генерацию миниатюр в очередь."""
+        with mock.patch('posts.thumbnails.submit') as submit, mock.patch(
+            'posts.thumbnails.transaction.on_commit',
+            side_effect=lambda callback: callback()
+        ):
+            Post.objects.create(
+                author=self.user,
+                text='Ещё пост',
+                image=SimpleUploadedFile('other.gif', SMALL_GIF, 'image/gif'),
+            )
+        submit.assert_called_once()
+
+    def test_placeholder_until_rendition_exists(self):
+        with mock.patch('posts.thumbnails.submit'):
+            self.assertIn(PLACEHOLDER, self.render())
+        generate_renditions(self.post.image.name)
+        url = self.render()
+        self.assertNotIn(PLACEHOLDER, url)
+        self.assertTrue(url.startswith(settings.MEDIA_URL))
+
+    def test_post_without_image(self):
+        self.post.image = None
+        self.assertEqual(self.render(), '')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResponsiveRenditionTagTests(TestCase):
+    template = Template(
+        '{% load renditions %}'
+        '{% responsive_rendition post.image "960x339" css_class="card-img" '
+        'crop="center" upscale=True %}'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Одинаковые картинки делят миниатюры, поэтому сбрасываем
+        # закэшированные ключи sorl от других тестов.
+        caches[settings.THUMBNAIL_CACHE].clear()
+
+    def render(self):
+        return self.template.render(Context({'post': self.post}))
+
+    def test_variants_keep_aspect_ratio(self):
+        geometries = [
+            geometry for _, _, geometry, _ in variants('960x339')
+        ]
+        self.assertEqual(geometries[:3], ['320x113', '640x226', '960x339'])
+
+    def test_placeholder_until_renditions_exist(self):
+        with mock.patch('posts.thumbnails.submit'):
+            html = self.render()
+        self.assertIn(PLACEHOLDER, html)
+        self.assertNotIn('srcset', html)
+
+    def test_srcset_lists_every_width(self):
+        generate_renditions(self.post.image.name)
+        html = self.render()
+        self.assertNotIn(PLACEHOLDER, html)
+        self.assertIn('class="card-img"', html)
+        for width in (320, 640, 960):
+            self.assertIn(f' {width}w', html)
+
+    @override_settings(POST_IMAGE_MODERN_FORMATS=(('PNG', 'image/png'),))
+    def test_modern_formats_become_sources(self):
+        """Форматы, которые умеет Pillow, отдаются через <source>."""
+        with mock.patch('posts.thumbnails.features.check', return_value=True):
+            generate_renditions(self.post.image.name)
+            html = self.render()
+        self.assertIn('<source type="image/png"', html)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class ThumbnailWorkerTests(TransactionTestCase):
+    """Миниатюры создаёт настоящий воркер пула после коммита поста."""
+
+    def setUp(self):
+        caches[settings.THUMBNAIL_CACHE].clear()
+        caches[settings.FEED_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def test_worker_renders_and_refreshes_post_page(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        with mock.patch('posts.thumbnails._executor', pool):
+            post = self.create_post()
+            version = get_feed_version(POST_PAGE, post.pk)
+            pool.shutdown(wait=True)
+        self.assertIsNotNone(backend.lookup(post.image, '960x339',
+                                            crop='center', upscale=True))
+        self.assertNotEqual(get_feed_version(POST_PAGE, post.pk), version)
+
+    def test_existing_renditions_do_not_refresh_feeds(self):
+        with override_settings(THUMBNAIL_WORKERS=0):
+            post = self.create_post()
+        version = get_feed_version(POST_PAGE, post.pk)
+        render(post.image.name)
+        self.assertEqual(get_feed_version(POST_PAGE, post.pk), version)
@@ -4,13 +4,16 @@ import tempfile
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ..forms import Comment, PostForm
 from ..models import Follow, Group, Post
+from ..timeline import rebuild_timelines
 
 User = get_user_model()
 
@@ -228,6 +231,8 @@ class PaginatorViewsTest(TestCase):
         self.authorized_client = Client()
         self.user = self.author
         self.authorized_client.force_login(self.user)
+        # Анонимам страницы отдаются из кэша целиком, без контекста.
+        caches['pages'].clear()
 
     def test_first_page_contains_ten_records(self):
         list_urls = {
@@ -255,6 +260,44 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(len(
                 response.context.get('page_obj').object_list), 3)
 
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсоры next/prev проходят ленту без пропусков и повторов."""
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first.previous_cursor, '')
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertEqual(second.next_cursor, '')
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        self.assertEqual(list(first) + list(second), expected)
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(back.previous_cursor, '')
+
+    def test_cursor_page_without_count(self):
+        """Keyset-страница не считает количество записей."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'User'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url, {'cursor': first.next_cursor})
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+                    self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
 
 class PostGroupPages(TestCase):
     @classmethod
@@ -323,6 +366,46 @@ class CacheViewsTest(TestCase):
         response_2 = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, response_2.content)
 
+    def test_index_does_not_clear_cache(self):
+        """Главная страница не сбрасывает чужие записи в кэше."""
+        cache.set('unrelated_key', 'value')
+        self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(cache.get('unrelated_key'), 'value')
+
+    def test_feeds_invalidated_on_post_change(self):
+        """Новый пост сбрасывает кэш всех лент, где он виден."""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.author)
+        follower_client = Client()
+        follower_client.force_login(follower)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        follower_client.get(reverse('posts:follow_index'))
+        Post.objects.create(
+            text='Свежий пост',
+            group=self.group,
+            author=self.author,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+        self.assertContains(
+            follower_client.get(reverse('posts:follow_index')),
+            'Свежий пост'
+        )
+
+    def test_feed_cached_until_change(self):
+        """Без изменений лента отдаётся из кэша."""
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Обход сигналов')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Обход сигналов')
+
 
 class FollowTests(TestCase):
     def setUp(self):
@@ -364,3 +447,168 @@ class FollowTests(TestCase):
         response = self.client_auth_following.get('/follow/')
         self.assertNotContains(response,
                                'Тестовая запись для тестирования ленты')
+
+    def test_timeline_fan_out_and_purge(self):
+        """Подписка и новые посты попадают в ленту, отписка чистит её."""
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        new_post = Post.objects.create(author=self.user_2, text='Новый пост')
+        self.assertEqual(
+            set(self.user_1.timeline.values_list('post_id', flat=True)),
+            {self.post.pk, new_post.pk}
+        )
+        Follow.objects.filter(user=self.user_1).delete()
+        self.assertFalse(self.user_1.timeline.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_read_on_demand(self):
+        """Посты популярного автора подмешиваются при чтении ленты."""
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        Post.objects.create(author=self.user_2, text='Пост звезды')
+        self.assertFalse(
+            self.user_1.timeline.filter(post__text='Пост звезды').exists())
+        response = self.client_auth_follower.get('/follow/')
+        self.assertContains(response, 'Пост звезды')
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_rebuild_keeps_newest_posts_of_every_follow(self):
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        Follow.objects.create(user=self.user_2, author=self.user_1)
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}')
+            for i in range(4) for author in (self.user_1, self.user_2)
+        )
+        rebuild_timelines()
+        for user, author in ((self.user_1, self.user_2),
+                             (self.user_2, self.user_1)):
+            with self.subTest(user=user.username):
+                expected = list(Post.objects.filter(author=author).order_by(
+                    '-pub_date', '-pk').values_list('pk', flat=True)[:3])
+                self.assertEqual(list(user.timeline.order_by(
+                    '-pub_date', '-post_id').values_list(
+                    'post_id', flat=True)), expected)
+
+    @override_settings(TIMELINE_SIZE=2)
+    def test_fan_out_trims_only_overfull_timelines(self):
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(author=self.user_2, text='Второй пост')
+        self.assertFalse(any(
+            query['sql'].startswith('DELETE') for query in queries
+        ))
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(author=self.user_2, text='Третий пост')
+        self.assertTrue(any(
+            query['sql'].startswith('DELETE') for query in queries
+        ))
+        self.assertEqual(self.user_1.timeline.count(), 2)
+
+    @override_settings(TIMELINE_SIZE=2)
+    def test_trimmed_timeline_keeps_older_posts_reachable(self):
+        """Ограниченная лента не теряет старые посты подписок."""
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        for i in range(12):
+            Post.objects.create(author=self.user_2, text=f'Пост {i}')
+        self.assertEqual(self.user_1.timeline.count(), 2)
+        first = self.client_auth_follower.get('/follow/').context['page_obj']
+        second = self.client_auth_follower.get(
+            '/follow/', {'cursor': first.next_cursor}).context['page_obj']
+        self.assertEqual(len(first) + len(second), 13)
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_follow_feed_pages_past_trimmed_timeline(self):
+        """Курсор ведёт через горизонт обрезанной ленты и обратно."""
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        for i in range(24):
+            Post.objects.create(author=self.user_2, text=f'Пост {i}')
+        expected = list(Post.objects.filter(author=self.user_2).order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True))
+        pages = [self.client_auth_follower.get(
+            '/follow/').context['page_obj']]
+        while pages[-1].next_cursor:
+            pages.append(self.client_auth_follower.get(
+                '/follow/', {'cursor': pages[-1].next_cursor}
+            ).context['page_obj'])
+        self.assertEqual(
+            [post.pk for page in pages for post in page], expected)
+        previous = self.client_auth_follower.get(
+            '/follow/', {'cursor': pages[-1].previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in previous], [post.pk for post in pages[-2]])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_merged_in_page_order(self):
+        """Посты популярного автора встают на своё место в ленте."""
+        author = User.objects.create_user(username='author')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        Follow.objects.create(user=fan, author=self.user_2)
+        Follow.objects.create(user=self.user_1, author=author)
+        for i in range(8):
+            Post.objects.create(author=self.user_2, text=f'Звезда {i}')
+            Post.objects.create(author=author, text=f'Пост {i}')
+        expected = list(Post.objects.filter(
+            author__in=[self.user_2, author]
+        ).order_by('-pub_date', '-pk').values_list('pk', flat=True))
+        first = self.client_auth_follower.get('/follow/').context['page_obj']
+        second = self.client_auth_follower.get(
+            '/follow/', {'cursor': first.next_cursor}).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in first] + [post.pk for post in second],
+            expected)
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Comment.objects.create(
+            text='Комментарий', post=post, author=cls.follower)
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {i}', post=post, author=cls.author)
+            for i in range(30)
+        )
+        cls.post = post
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(15)
+        )
+        # bulk_create обходит сигналы, ленты подписок собираем вручную.
+        rebuild_timelines()
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        caches['feeds'].clear()
+
+    def test_feed_query_count_is_fixed(self):
+        """Число запросов на страницу не зависит от числа записей."""
+        pages = (
+            (reverse('posts:index'), 2, 'page_obj', 10),
+            # Группа и профиль - плюс поиск id для ETag.
+            (reverse('posts:group_list', kwargs={'slug': 'test-slug'}), 4,
+             'page_obj', 10),
+            (reverse('posts:profile', kwargs={'username': 'author'}), 5,
+             'page_obj', 10),
+            # Лента подписок: ключи из ленты, популярные авторы, посты.
+            (reverse('posts:follow_index'), 4, 'page_obj', 10),
+            # Пост: автор для ETag, пользователь, пост и комментарии.
+            (reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+             4, 'comments', 20),
+        )
+        for url, queries, name, length in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.follower_client.get(url)
+                self.assertEqual(len(response.context[name]), length)
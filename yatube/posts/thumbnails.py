@@ -0,0 +1,190 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры, которые шаблоны показывают для картинок постов
+RENDITIONS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Ширины для srcset: телефон, планшет, десктоп
+WIDTHS = (320, 640, 960)
+# Форматы, которые отдаются браузерам с их поддержкой, если их умеет Pillow
+MODERN_FORMATS = (
+    ('WEBP', 'image/webp'),
+)
+WORKERS = 2
+PLACEHOLDER = 'img/placeholder.svg'
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def workers():
+    """Размер пула; 0 - миниатюры создаются сразу, без пула."""
+    return getattr(settings, 'THUMBNAIL_WORKERS', WORKERS)
+
+
+def renditions():
+    return getattr(settings, 'POST_IMAGE_RENDITIONS', RENDITIONS)
+
+
+def widths():
+    return getattr(settings, 'POST_IMAGE_WIDTHS', WIDTHS)
+
+
+def modern_formats():
+    return [
+        (image_format, mime_type)
+        for image_format, mime_type in getattr(
+            settings, 'POST_IMAGE_MODERN_FORMATS', MODERN_FORMATS
+        )
+        if features.check(image_format.lower())
+    ]
+
+
+def scaled(geometry, width):
+    """Геометрия с пропорциями geometry и шириной width."""
+    base_width, _, base_height = geometry.partition('x')
+    if not base_height:
+        return str(width)
+    return f'{width}x{round(int(base_height) * width / int(base_width))}'
+
+
+def variants(geometry, **options):
+    """Все миниатюры одной рендиции для srcset.
+
+    Отдаёт кортежи (формат, ширина, геометрия, опции); формат None -
+    основной формат миниатюр sorl. Ширины больше исходной геометрии
+    не используются: крупнее неё картинку никто не показывает.
+    """
+    base_width = int(geometry.partition('x')[0])
+    sizes = sorted({width for width in widths() if width < base_width})
+    sizes.append(base_width)
+    formats = [None] + [image_format for image_format, _ in modern_formats()]
+    for image_format in formats:
+        for width in sizes:
+            variant = dict(options)
+            if image_format is not None:
+                variant['format'] = image_format
+            yield image_format, width, scaled(geometry, width), variant
+
+
+class LookupThumbnailBackend(ThumbnailBackend):
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей sorl или None.
+
+        В отличие от get_thumbnail ничего не генерирует, поэтому
+        безопасна для вызова из запроса.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = LookupThumbnailBackend()
+
+
+def generate_renditions(name):
+    """Создаёт недостающие миниатюры картинки.
+
+    Возвращает True, если появилась хоть одна новая: только тогда
+    ленты с заглушкой на месте миниатюры нужно сбросить.
+    """
+    from .storage import post_image_storage
+
+    # Ключ миниатюр в sorl зависит от хранилища исходника.
+    source = ImageFile(name, post_image_storage)
+    created = False
+    try:
+        for geometry, options in renditions():
+            for _, _, variant, variant_options in variants(
+                geometry, **options
+            ):
+                if backend.lookup(source, variant, **variant_options):
+                    continue
+                get_thumbnail(source, variant, **variant_options)
+                created = True
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    return created
+
+
+def refresh_feeds(name):
+    """Сбрасывает кэш лент и страниц постов с этой картинкой.
+
+    Там вместо миниатюры закэширована заглушка.
+    """
+    from .feeds import POST_PAGE, bump_feed_versions, feed_key, post_feed_keys
+    from .models import Post
+
+    keys = []
+    for post in Post.objects.filter(image=name).values(
+        'pk', 'author_id', 'group_id'
+    ):
+        keys.append(feed_key(POST_PAGE, post['pk']))
+        keys.extend(post_feed_keys(post['author_id'], post['group_id']))
+    bump_feed_versions(keys)
+
+
+def render(name):
+    if generate_renditions(name):
+        refresh_feeds(name)
+
+
+def work(name):
+    """Задача воркера пула."""
+    try:
+        render(name)
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+        # Поток воркера сам открыл соединения с БД для kvstore.
+        connections.close_all()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=workers(),
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def submit(name):
+    if not workers():
+        # Без пула миниатюры делаются сразу, в потоке запроса.
+        render(name)
+        return
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    executor().submit(work, name)
+
+
+def schedule_renditions(name):
+    """Ставит генерацию миниатюр в фоновый пул после коммита."""
+    if name:
+        transaction.on_commit(lambda: submit(name))
@@ -0,0 +1,222 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .paginators import (NEXT, TEN, CursorPaginator, decode_cursor,
+                         keyset)
+
+# Сколько последних постов хранится в ленте одного подписчика
+TIMELINE_SIZE = 500
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении
+FANOUT_LIMIT = 1000
+# Сколько лент обрезается одной командой DELETE
+TRIM_BATCH_SIZE = 500
+
+
+def timeline_size():
+    return getattr(settings, 'TIMELINE_SIZE', TIMELINE_SIZE)
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', FANOUT_LIMIT)
+
+
+def trim_timelines(user_ids, apps=global_apps):
+    """Оставляет в лентах пользователей только последние записи.
+
+    Одна команда DELETE на пачку пользователей: записи нумеруются
+    внутри ленты каждого, и удаляются те, что дальше TIMELINE_SIZE.
+    Сначала по индексу считаются записи в лентах пачки, и нумеруются
+    только переполненные ленты - обычно их нет или единицы.
+    """
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), TRIM_BATCH_SIZE):
+        overfull = list(TimelineEntry.objects.filter(
+            user_id__in=user_ids[start:start + TRIM_BATCH_SIZE]
+        ).order_by().values('user_id').annotate(
+            entries=Count('id')
+        ).filter(entries__gt=timeline_size()).values_list(
+            'user_id', flat=True
+        ))
+        if not overfull:
+            continue
+        ranked = TimelineEntry.objects.filter(
+            user_id__in=overfull
+        ).annotate(position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('pub_date').desc(), F('post_id').desc()],
+        )).order_by().values('pk', 'position')
+        sql, params = ranked.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TimelineEntry._meta.db_table} WHERE id IN '
+                f'(SELECT id FROM ({sql}) ranked WHERE position > %s)',
+                (*params, timeline_size()),
+            )
+
+
+def trim_timeline(user_id, apps=global_apps):
+    trim_timelines([user_id], apps)
+
+
+def is_celebrity(author_id):
+    from .models import AuthorStats
+
+    return AuthorStats.objects.filter(
+        user_id=author_id, followers_count__gt=fanout_limit()
+    ).exists()
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    from .models import Follow, TimelineEntry
+
+    if is_celebrity(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timelines(followers)
+
+
+def backfill_timeline(user_id, author_id, apps=global_apps):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:timeline_size()]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timeline(user_id, apps)
+
+
+def purge_timeline(user_id, author_id):
+    """Убирает из ленты бывшего подписчика посты автора."""
+    from .models import TimelineEntry
+
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild_timelines(apps=global_apps):
+    """Пересобирает ленты всех подписчиков с нуля.
+
+    Одна команда INSERT ... SELECT: пары подписка - пост автора
+    нумеруются внутри ленты каждого подписчика, и вставляются только
+    первые TIMELINE_SIZE, так что обрезать ленты потом не нужно.
+    """
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.all().delete()
+    # Пост соединяется с подписками на своего автора.
+    ranked = Post.objects.annotate(
+        entry_user=F('author__following__user_id'),
+        position=Window(
+            RowNumber(),
+            partition_by=[F('author__following__user_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        ),
+    ).order_by().values('entry_user', 'id', 'pub_date', 'position')
+    sql, params = ranked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT entry_user, id, pub_date FROM ({sql}) ranked '
+            f'WHERE entry_user IS NOT NULL AND position <= %s',
+            (*params, timeline_size()),
+        )
+
+
+def timeline_horizon(entries):
+    """Ключ (дата, id) самой старой записи полной ленты.
+
+    Всё, что старше, в ленте уже не хранится. None - лента не
+    заполнена до TIMELINE_SIZE и в ней есть все посты подписок.
+    """
+    size = timeline_size()
+    horizon = entries.order_by('-pub_date', '-post_id').values_list(
+        'pub_date', 'post_id'
+    )[size - 1:size]
+    return horizon[0] if horizon else None
+
+
+def follow_page(user, token=None, posts=None, per_page=TEN):
+    """Страница ленты подписок пользователя по курсору.
+
+    Ключи (дата, id) постов страницы читаются из материализованной
+    ленты по индексу (user, -pub_date, -post). Посты популярных авторов
+    в ленту не раскладываются: они дочитываются по каждому автору в
+    пределах окна этой страницы. Если курсор ушёл дальше обрезанной
+    ленты, более старые посты ищутся по подпискам напрямую.
+    posts - queryset, из которого берутся сами посты, например
+    values() для API.
+    """
+    from .models import Follow, Post, TimelineEntry
+
+    if posts is None:
+        posts = Post.objects.feed()
+    cursor = decode_cursor(token) if token else None
+    newest_first = cursor is None or cursor[0] == NEXT
+    limit = per_page + 1
+    entries = TimelineEntry.objects.filter(user=user)
+    keys = set(keyset(entries, cursor, pk='post_id').values_list(
+        'pub_date', 'post_id'
+    )[:limit])
+    # Край окна страницы: если лента дала полную страницу, всё, что
+    # за ним, на эту страницу уже не попадёт.
+    edge = None
+    if len(keys) == limit:
+        edge = min(keys) if newest_first else max(keys)
+    follows = Follow.objects.filter(user=user)
+    celebrities = follows.filter(
+        author__stats__followers_count__gt=fanout_limit()
+    ).values_list('author_id', flat=True)
+    for author_id in celebrities:
+        window = keyset(Post.objects.filter(author_id=author_id), cursor)
+        if edge is not None:
+            window = window.filter(**{
+                'pub_date__gte' if newest_first else 'pub_date__lte': edge[0]
+            })
+        keys.update(window.values_list('pub_date', 'pk')[:limit])
+    # Старше горизонта обрезанной ленты могут быть посты на этой
+    # странице: вперёд - если лента кончилась раньше страницы,
+    # назад - если курсор уже за горизонтом.
+    horizon = None
+    if edge is None or not newest_first:
+        horizon = timeline_horizon(entries)
+    if horizon is not None and (newest_first or cursor[1:] < horizon):
+        older = keyset(
+            Post.objects.filter(author_id__in=follows.values('author_id')),
+            (NEXT, *horizon),
+        )
+        keys.update(keyset(older, cursor).values_list(
+            'pub_date', 'pk'
+        )[:limit])
+    ids = [pk for _, pk in sorted(keys, reverse=newest_first)[:limit]]
+    found = {
+        row['id'] if isinstance(row, dict) else row.pk: row
+        for row in posts.filter(pk__in=ids).order_by()
+    }
+    return CursorPaginator(posts, per_page).page_from(
+        [found[pk] for pk in ids if pk in found], cursor, token
+    )
@@ -11,8 +11,15 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('search/', views.search, name='search'),
+    path('export/', views.export, name='export'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
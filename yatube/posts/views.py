@@ -1,12 +1,21 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
-from django.core.paginator import Paginator
+from django.http import (HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
 
+from .export import (CONTENT_TYPES, GZIP_CONTENT_TYPE, NDJSON, TABLES,
+                     export_filename, export_stream)
+from .feeds import (FOLLOW_FEED, GROUP_FEED, INDEX_FEED, POST_PAGE,
+                    PROFILE_FEED, get_feed_version, page_etag)
 from .forms import CommentForm, Follow, PostForm
-from .models import Group, Post, User
-
-TEN = 10
+from .models import AuthorStats, Comment, Group, Post, User
+from .paginators import (COMMENTS_PER_PAGE, TEN, CursorPaginator,
+                         paginate)
+from .search import search_page
+from .timeline import follow_page
 
 
 def authorized_only(func):
@@ -23,75 +32,179 @@ def authorized_only(func):
     return check_user
 
 
+# ETag страниц считается по версиям лент из кэша: на совпавший
+# If-None-Match отвечаем 304, не выполняя view и не рендеря шаблон.
+# Last-Modified не выставляем: дата поста не меняется при правке
+# и удалении, а версия ленты меняется.
+
+def index_etag(request):
+    return page_etag(request, (INDEX_FEED, None))
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return page_etag(request, (GROUP_FEED, group_id))
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    feeds = [(PROFILE_FEED, author_id)]
+    if request.user.is_authenticated:
+        # Кнопка подписки зависит от подписок посетителя.
+        feeds.append((FOLLOW_FEED, request.user.pk))
+    return page_etag(request, *feeds)
+
+
+def post_etag(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    # Лента автора - ради счётчика его постов на странице.
+    return page_etag(
+        request, (POST_PAGE, post_id), (PROFILE_FEED, author_id)
+    )
+
+
+def follow_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    return page_etag(request, (FOLLOW_FEED, request.user.pk))
+
+
+@vary_on_cookie
+@condition(etag_func=index_etag)
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
+    post_list = Post.objects.feed().order_by('-pub_date')
     template = 'posts/index.html'
     # Если порядок сортировки определен в классе Meta модели,
     # запрос будет выглядить так:
     # post_list = Post.objects.all()
-    # Показывать по 10 записей на странице.
-    paginator = Paginator(post_list, TEN)
-
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get('page')
-
-    # Получаем набор записей для страницы с запрошенным номером
-    page_obj = paginator.get_page(page_number)
+    # Показываем по 10 записей на странице: по курсору ?cursor=
+    # или по старому номеру страницы ?page=
+    page_obj = paginate(request, post_list)
     # Отдаем в словаре контекста
     context = {
         'page_obj': page_obj,
+        'feed_version': get_feed_version(INDEX_FEED),
     }
-    cache.clear()
     return render(request, template, context)
 
 
+@vary_on_cookie
+@condition(etag_func=group_etag)
 def group_post(request, slug):
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
-    posts = Post.objects.filter(group=group).order_by('-pub_date')
-    paginator = Paginator(posts, TEN)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.feed().filter(group=group).order_by('-pub_date')
+    page_obj = paginate(request, posts)
     text = 'Здесь будет информация о группах проекта Yatube'
     context = {
         'group': group,
         'posts': posts,
         'text': text,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'feed_version': get_feed_version(GROUP_FEED, group.pk),
     }
     return render(request, template, context)
 
 
+@vary_on_cookie
+@condition(etag_func=profile_etag)
 def profile(request, username):
     # Здесь код запроса к модели и создание словаря контекста
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = AuthorStats.for_user(author)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             author=author,
             user=request.user).exists()
     else:
         following = False
-    posts = Post.objects.filter(author=author).order_by("-pub_date").all()
-    paginator = Paginator(posts, TEN)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.feed().filter(author=author).order_by('-pub_date')
+    page_obj = paginate(request, posts)
     template = 'posts/profile.html'
     context = {
         'author': author,
         'posts': posts,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'posts_count': stats.posts_count,
+        'stats': stats,
+        'feed_version': get_feed_version(PROFILE_FEED, author.pk),
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    template = 'posts/search.html'
+    page_obj = None
+    if query:
+        page_obj = search_page(query, request.GET.get('page'), TEN)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+def comments_page(post_id, cursor):
+    """Порция комментариев поста по курсору, новые сначала."""
+    comments = Comment.objects.listing().filter(post_id=post_id)
+    return CursorPaginator(
+        comments, COMMENTS_PER_PAGE, field='created'
+    ).cursor_page(cursor)
+
+
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments = comments_page(post.pk, request.GET.get('cursor'))
+    if (request.GET.get('format') == 'json'
+            or 'application/json' in request.META.get('HTTP_ACCEPT', '')):
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    template = 'posts/includes/comment_list.html'
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
+@vary_on_cookie
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     # Здесь код запроса к модели и создание словаря контекста
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.feed().select_related('author__stats'), id=post_id
+    )
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
-    post_count = Post.objects.filter(author=post.author).count()
-    comments = post.comments.all()
+    post_count = AuthorStats.for_user(post.author).posts_count
+    comments = comments_page(post.pk, request.GET.get('cursor'))
     context = {
         'post': post,
         'post_count': post_count,
@@ -160,15 +273,15 @@ def add_comment(request, post_id):
 
 
 @login_required
+@vary_on_cookie
+@condition(etag_func=follow_etag)
 def follow_index(request):
     template = 'posts/follow.html'
     user = request.user
-    posts_list = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(posts_list, TEN)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = follow_page(user, request.GET.get('cursor'))
     context = {
         'page_obj': page_obj,
+        'feed_version': get_feed_version(FOLLOW_FEED, user.pk),
     }
     return render(request, template, context)
 
@@ -199,3 +312,28 @@ def profile_unfollow(request, username):
             user=follow_user,
         ).delete()
     return redirect(template)
+
+
+@staff_member_required
+def export(request):
+    """Потоковая выгрузка таблиц для сотрудников.
+
+    ?table= можно повторять, ?format=ndjson|csv, ?gzip=1 сжимает поток.
+    """
+    tables = request.GET.getlist('table') or list(TABLES)
+    export_format = request.GET.get('format', NDJSON)
+    compress = request.GET.get('gzip') == '1'
+    try:
+        chunks = export_stream(tables, export_format, compress=compress)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        chunks,
+        content_type=(
+            GZIP_CONTENT_TYPE if compress
+            else f'{CONTENT_TYPES[export_format]}; charset=utf-8'
+        ),
+    )
+    filename = export_filename(tables, export_format, compress)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -50,9 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInspectionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.AnonymousCacheMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -60,6 +64,24 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'yatube.urls'
+# Метрики запросов по view. Страницу /metrics/ отдаём сотрудникам,
+# запросам с заголовком Authorization: Bearer <METRICS_TOKEN> (пустой
+# токен не подходит) и адресам из METRICS_ALLOWED_IPS. Список по
+# умолчанию пуст: за nginx все запросы приходят с 127.0.0.1.
+METRICS_ENABLED = True
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = list(filter(None, os.getenv(
+    'YATUBE_METRICS_ALLOWED_IPS', ''
+).split(',')))
+# Журнал медленных запросов и поиск N+1 для разработки и стенда
+QUERY_INSPECTION = DEBUG
+SLOW_QUERY_SECONDS = 0.1
+# Столько одинаковых по форме запросов за запрос считается N+1
+REPEATED_QUERY_THRESHOLD = 5
+# Наибольшее число запросов к базе для view, например
+# {'posts:index': 6}; с QUERY_BUDGET_ENFORCED превышение - исключение
+QUERY_BUDGETS = {}
+QUERY_BUDGET_ENFORCED = False
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 LOGIN_URL = 'users:login'
@@ -68,7 +90,8 @@ EMAIL_BACKEND = 'django.core.mail.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендера для метрик
+        'BACKEND': 'core.backends.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,13 +112,95 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# Бэкенд задаётся окружением так же, как кэш: YATUBE_DB_* для всех
+# баз или YATUBE_DB_<АЛИАС>_* для одной. ENGINE - sqlite или
+# postgresql; POOL=0 отключает пул соединений из core.backends.
+# POOLER=pgbouncer - соединения держит внешний PgBouncer в режиме
+# transaction, свой пул не нужен, а серверные курсоры недоступны.
+
+DB_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+POOLED_DB_ENGINES = {
+    'sqlite': 'core.backends.sqlite3',
+    'postgresql': 'core.backends.postgresql',
+}
+
+
+def database_settings(alias, name=None):
+    def env(key, default=''):
+        return os.getenv(
+            f'YATUBE_DB_{alias.upper()}_{key}',
+            os.getenv(f'YATUBE_DB_{key}', default)
+        )
+
+    engine = env('ENGINE', 'sqlite')
+    pooler = env('POOLER')
+    pooled = env('POOL', '1') == '1' and not pooler
+    max_age = env('CONN_MAX_AGE', '0')
+    database = {
+        'ENGINE': (POOLED_DB_ENGINES if pooled else DB_ENGINES)[engine],
+        # Сколько секунд поток держит соединение; с пулом 0 - соединение
+        # возвращается в пул в конце каждого запроса. none - бессрочно.
+        'CONN_MAX_AGE': None if max_age == 'none' else int(max_age),
+        'POOL': {
+            'MAX_SIZE': int(env('POOL_MAX_SIZE', '10')),
+            'MAX_LIFETIME': int(env('POOL_MAX_LIFETIME', '600')),
+            'HEALTH_CHECKS': env('POOL_HEALTH_CHECKS', '1') == '1',
+        },
     }
+    if engine == 'sqlite':
+        database['NAME'] = name or env(
+            'NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        )
+        return database
+    database.update({
+        'NAME': name or env('NAME', 'yatube'),
+        'USER': env('USER', 'yatube'),
+        'PASSWORD': env('PASSWORD'),
+        'HOST': env('HOST', '127.0.0.1'),
+        'PORT': env('PORT', '5432'),
+        'DISABLE_SERVER_SIDE_CURSORS': pooler == 'pgbouncer',
+    })
+    return database
+
+
+DATABASES = {
+    'default': database_settings('default'),
+}
+
+# PRAGMA каждого нового соединения SQLite. Базе в DATABASES можно
+# задать свои значения ключом PRAGMAS.
+SQLITE_PRAGMAS = {
+    # Читатели не ждут писателя, писатель не ждёт читателей
+    'journal_mode': 'wal',
+    # В режиме WAL база не портится при сбое и без fsync на каждый коммит
+    'synchronous': 'normal',
+    # Сколько миллисекунд ждать блокировку вместо "database is locked"
+    'busy_timeout': 5000,
+    # Кэш страниц на соединение; отрицательное значение - в КиБ
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
 }
 
+# Реплики только для чтения: YATUBE_DB_REPLICAS - имена баз через
+# запятую, для SQLite - пути к файлам. Локально это копии db.sqlite3,
+# в работе - реплики, которые догоняет основная база. В тестах
+# реплики смотрят в тестовую базу default.
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+    filter(None, os.getenv('YATUBE_DB_REPLICAS', '').split(',')), 1
+):
+    DATABASES[f'replica_{number}'] = {
+        **database_settings(f'replica_{number}', name),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# Сколько секунд после записи посетитель читает с основной базы
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,8 +244,87 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Cache
+# Бэкенд задаётся окружением: YATUBE_CACHE_BACKEND для всех алиасов сразу
+# или YATUBE_CACHE_<АЛИАС>_BACKEND для одного, аналогично *_LOCATION.
+# locmem - свой кэш у каждого воркера; sqlite и file - общий для всех
+# воркеров на сервере; memcached - общий для нескольких серверов. Вместо
+# имени можно указать путь к классу любого бэкенда, например
+# django_redis.cache.RedisCache, если пакет установлен.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+}
+CACHE_DIR = os.getenv('YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+CACHE_DEFAULT_LOCATIONS = {
+    'locmem': '{alias}',
+    'file': os.path.join(CACHE_DIR, '{alias}'),
+    'sqlite': os.path.join(CACHE_DIR, '{alias}.sqlite3'),
+    'memcached': '127.0.0.1:11211',
+}
+
+
+def cache_settings(alias, timeout=300, backend='locmem', max_entries=300):
+    """Настройки алиаса; backend - бэкенд, если окружение его не задаёт."""
+    prefix = f'YATUBE_CACHE_{alias.upper()}_'
+    backend = os.getenv(
+        prefix + 'BACKEND', os.getenv('YATUBE_CACHE_BACKEND', backend)
+    )
+    location = os.getenv(
+        prefix + 'LOCATION',
+        CACHE_DEFAULT_LOCATIONS.get(backend, '{alias}').format(alias=alias)
+    )
+    options = {
+        'BACKEND': CACHE_BACKENDS.get(backend, backend),
+        'LOCATION': location,
+        'TIMEOUT': timeout,
+        'KEY_PREFIX': alias,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
     }
+    if METRICS_ENABLED:
+        # Обёртка считает попадания и промахи алиаса в метриках
+        options['WRAPPED_BACKEND'] = options['BACKEND']
+        options['BACKEND'] = 'core.metrics.InstrumentedCache'
+    return options
+
+
+CACHES = {
+    'default': cache_settings('default'),
+    # Версии лент и закэшированные фрагменты страниц. Версии меняет
+    # воркер, который обработал запись, а видеть их должны все воркеры,
+    # поэтому по умолчанию кэш общий для процессов сервера.
+    'feeds': cache_settings(
+        'feeds', timeout=600, backend='sqlite', max_entries=50000
+    ),
+    # Ключи sorl-thumbnail: размеры и пути готовых миниатюр
+    'thumbnails': cache_settings('thumbnails', timeout=None),
+    # Сессии тоже общие: иначе после выхода в одном воркере другие
+    # воркеры ещё две недели находили бы удалённую сессию в своём кэше
+    'sessions': cache_settings(
+        'sessions', timeout=60 * 60 * 24 * 14, backend='sqlite',
+        max_entries=50000
+    ),
+    # Целые страницы для анонимных посетителей; общий по той же причине:
+    # их версии сбрасывает воркер, который обработал запись
+    'pages': cache_settings(
+        'pages', timeout=600, backend='sqlite', max_entries=10000
+    ),
 }
+FEED_CACHE_ALIAS = 'feeds'
+PAGE_CACHE_ALIAS = 'pages'
+ANONYMOUS_CACHE_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+)
+THUMBNAIL_CACHE = 'thumbnails'
+# Потоки, которые создают миниатюры после загрузки; 0 - миниатюры
+# создаются сразу в запросе, без пула
+THUMBNAIL_WORKERS = int(os.getenv('YATUBE_THUMBNAIL_WORKERS', '2'))
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+TEST_RUNNER = 'core.runner.TestRunner'
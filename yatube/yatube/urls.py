@@ -20,10 +20,12 @@ from django.urls import include, path
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('', include('core.urls', namespace='core')),
 ]
 
 handler404 = 'core.views.page_not_found'